@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+"""Benchmarks of the bpmappers hot paths.
+
+Usage::
+
+   $ python benchmarks/run.py
+   $ python benchmarks/run.py --json result.json
+   $ python benchmarks/run.py --compare result.json
+   $ python benchmarks/run.py wide_flat nested_delegate
+
+Each case reports the operations per second (the best of the repeats) and
+the peak memory allocated by one operation, measured with tracemalloc.
+The ModelMapper cases use the SQLite database of tests/django_project and
+are skipped if Django is not installed, the NumPy cases are skipped if
+NumPy is not installed.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bpmappers import (  # NOQA: E402
+    Mapper, RawField, ChoiceField, NonKeyField, DelegateField,
+    ListDelegateField)
+
+CASES = {}
+
+
+def case(func):
+    """Register the function returning the operation of a case."""
+    CASES[func.__name__] = func
+    return func
+
+
+class Record(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+WIDE_FIELDS = 80
+
+
+@case
+def wide_flat():
+    "Mapper of 80 RawField from an object"
+    attrs = {'f%d' % i: RawField() for i in range(WIDE_FIELDS)}
+    WideMapper = type('WideMapper', (Mapper,), attrs)
+    obj = Record(**{'f%d' % i: i for i in range(WIDE_FIELDS)})
+    return lambda: WideMapper(obj).as_dict()
+
+
+@case
+def wide_flat_compiled():
+    "Compiled mapper of 80 RawField from an object"
+    attrs = {'f%d' % i: RawField() for i in range(WIDE_FIELDS)}
+    attrs['compiled'] = True
+    WideMapper = type('WideMapper', (Mapper,), attrs)
+    obj = Record(**{'f%d' % i: i for i in range(WIDE_FIELDS)})
+    return lambda: WideMapper(obj).as_dict()
+
+
+@case
+def deep_dotted_keys():
+    "Mapper of 10 RawField with 5 level dot splited keys"
+    attrs = {
+        'f%d' % i: RawField('a.b.c.d.v%d' % i) for i in range(10)}
+    DeepMapper = type('DeepMapper', (Mapper,), attrs)
+    leaf = {'v%d' % i: i for i in range(10)}
+    obj = Record(a=Record(b={'c': Record(d=leaf)}))
+    return lambda: DeepMapper(obj).as_dict()
+
+
+class PersonMapper(Mapper):
+    name = RawField()
+    age = RawField()
+
+
+class BookMapper(Mapper):
+    title = RawField()
+    author = DelegateField(PersonMapper)
+    editor = DelegateField(PersonMapper, required=False)
+
+
+@case
+def nested_delegate():
+    "Mapper with 2 DelegateField"
+    obj = Record(
+        title="spam", author=Record(name="egg", age=20),
+        editor=Record(name="ham", age=30))
+    return lambda: BookMapper(obj).as_dict()
+
+
+class ShelfMapper(Mapper):
+    name = RawField()
+    books = ListDelegateField(BookMapper)
+
+
+@case
+def large_list_delegate():
+    "ListDelegateField of 1000 objects"
+    books = [
+        Record(
+            title="book%d" % i, author=Record(name="egg", age=i),
+            editor=None)
+        for i in range(1000)]
+    obj = Record(name="shelf", books=books)
+    return lambda: ShelfMapper(obj).as_dict()
+
+
+@case
+def map_many():
+    "Mapper.map_many of 1000 objects"
+    books = [
+        Record(
+            title="book%d" % i, author=Record(name="egg", age=i),
+            editor=None)
+        for i in range(1000)]
+    return lambda: BookMapper.map_many(books)
+
+
+class HookMapper(Mapper):
+    spam = RawField(callback=str.upper)
+    egg = RawField(after_callback=len)
+    status = ChoiceField({0: "draft", 1: "published"})
+    label = NonKeyField()
+
+    def filter_spam(self, value):
+        return value.strip()
+
+    def after_filter_egg(self, value):
+        return value * 2
+
+    def filter_label(self):
+        return self.data['spam']
+
+    def attach_status(self, parsed, value):
+        parsed['status_label'] = value
+
+
+@case
+def hooks():
+    "Mapper with callbacks, filter, after_filter and attach hooks"
+    obj = {'spam': " spam ", 'egg': "egg", 'status': 1}
+    return lambda: HookMapper(obj).as_dict()
+
+
+class EventMapper(Mapper):
+    name = RawField()
+    status = ChoiceField({0: "draft", 1: "published", 2: "deleted"})
+    count = RawField(callback=int)
+
+
+EVENTS = [
+    {'name': "event%d" % i, 'status': i % 3, 'count': str(i)}
+    for i in range(10000)]
+
+
+@case
+def flat_map_many():
+    "Mapper.map_many of 10000 flat dicts"
+    return lambda: EventMapper.map_many(EVENTS)
+
+
+@case
+def flat_columnar():
+    "bpmappers.columnar.map_rows of 10000 flat dicts"
+    from bpmappers.columnar import map_rows
+    return lambda: map_rows(EventMapper, EVENTS)
+
+
+STATUSES = [i % 3 for i in range(10000)]
+
+
+@case
+def choice_lookup_many():
+    "ChoiceField.lookup_many of 10000 integers"
+    field = EventMapper._meta.fields['status'][0][1]
+    return lambda: field.lookup_many(STATUSES)
+
+
+@case
+def choice_lookup_numpy():
+    "bpmappers.columnar.lookup_choices of a NumPy array of 10000 integers"
+    import numpy
+    from bpmappers.columnar import lookup_choices
+    field = EventMapper._meta.fields['status'][0][1]
+    array = numpy.array(STATUSES)
+    return lambda: lookup_choices(field, array)
+
+
+NUMPY_CASES = {'choice_lookup_numpy'}
+
+
+def has_numpy():
+    try:
+        import numpy  # NOQA: F401
+    except ImportError:
+        return False
+    return True
+
+
+def setup_django():
+    try:
+        import django
+    except ImportError:
+        return False
+    sys.path.insert(0, os.path.join(BASE_DIR, 'tests', 'django_project'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return True
+
+
+def django_data():
+    from django_app.models import FK_ChildModel, FK_ParentModel
+    if not FK_ParentModel.objects.exists():
+        child = FK_ChildModel.objects.create(spam="egg")
+        FK_ParentModel.objects.bulk_create([
+            FK_ParentModel(bacon=child if i % 2 else None, knight="ni" * i)
+            for i in range(500)])
+    from bpmappers.djangomodel import ModelMapper
+
+    class ParentMapper(ModelMapper):
+        class Meta:
+            model = FK_ParentModel
+
+    return ParentMapper, FK_ParentModel.objects.order_by('id')
+
+
+@case
+def model_mapper():
+    "ModelMapper of 500 instances with ForeignKey"
+    ParentMapper, queryset = django_data()
+    objects = list(queryset.select_related('bacon'))
+    return lambda: ParentMapper.map_many(objects)
+
+
+@case
+def model_mapper_queryset():
+    "ModelMapper.map_queryset of 500 rows"
+    ParentMapper, queryset = django_data()
+    return lambda: ParentMapper.map_queryset(queryset)
+
+
+@case
+def model_mapper_values():
+    "ModelMapper.map_values of 500 rows"
+    ParentMapper, queryset = django_data()
+    return lambda: ParentMapper.map_values(queryset)
+
+
+DJANGO_CASES = {'model_mapper', 'model_mapper_queryset', 'model_mapper_values'}
+
+
+def measure(operation, repeat, min_time):
+    # calibrate the number of the operations in a timing
+    number = 1
+    while True:
+        elapsed = timeit.timeit(operation, number=number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = min(timeit.repeat(operation, number=number, repeat=repeat))
+    tracemalloc.start()
+    try:
+        current, _peak = tracemalloc.get_traced_memory()
+        operation()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'ops_per_sec': number / best,
+        'peak_bytes': peak - current,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cases', nargs='*', help='Names of the cases.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help='Minimum seconds of a timing.')
+    parser.add_argument('--json', help='Write the results to the file.')
+    parser.add_argument(
+        '--compare', help='Compare with the results of --json.')
+    args = parser.parse_args(argv)
+
+    names = args.cases or list(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error('unknown cases: %s' % ', '.join(sorted(unknown)))
+    if DJANGO_CASES & set(names) and not setup_django():
+        print('Django is not installed, skip the ModelMapper cases.')
+        names = [name for name in names if name not in DJANGO_CASES]
+    if NUMPY_CASES & set(names) and not has_numpy():
+        print('NumPy is not installed, skip the NumPy cases.')
+        names = [name for name in names if name not in NUMPY_CASES]
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)['results']
+
+    results = {}
+    print('%-24s %14s %12s %9s' % ('case', 'ops/sec', 'peak bytes', 'change'))
+    for name in names:
+        result = measure(CASES[name](), args.repeat, args.min_time)
+        results[name] = result
+        change = ''
+        if name in baseline:
+            change = '%+.1f%%' % (
+                (result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1)
+                * 100)
+        print('%-24s %14.1f %12d %9s' % (
+            name, result['ops_per_sec'], result['peak_bytes'], change))
+
+    if args.json:
+        import bpmappers
+        with open(args.json, 'w') as fp:
+            json.dump({
+                'version': '.'.join(
+                    str(v) for v in bpmappers.VERSION if v is not None),
+                'python': sys.version.split()[0],
+                'results': results,
+            }, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cache of the results of the delegated mappers.
+
+When many objects refer to the same related objects, the fields
+delegating to other mappers map the related objects again for every
+reference. Giving a ResultCache as the ``delegate_cache`` option maps
+each of them once::
+
+    from bpmappers.cache import ResultCache
+
+    results = OrderMapper.map_many(orders, delegate_cache=ResultCache())
+
+The cached results are shared by all the references, do not modify them.
+The cache is meant for a batch or a request, it is not thread safe.
+"""
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """Bounded LRU cache of the mapping results.
+
+    The results are cached by the mapper class, the projection of the
+    fields and the key of the mapped object, the object identity by
+    default. The least recently used result
+    is evicted when maxsize is exceeded.
+    """
+    def __init__(self, maxsize=1024, key=None):
+        """
+        :maxsize: The maximum number of the results, unbounded if None.
+        :key: Function returning the cache key of an object, e.g.
+         ``lambda obj: obj.pk``. The identity of the object if omitted.
+        """
+        self.maxsize = maxsize
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        # {(mapper_class, projection, key): (value, result)}
+        self._results = OrderedDict()
+
+    def get(self, mapper_class, value, as_dict, projection=None):
+        """Return the cached result of value, or map it with as_dict.
+
+        :mapper_class: Mapper class mapping value.
+        :value: Object to be mapped.
+        :as_dict: Function mapping value with mapper_class.
+        :projection: Projection of the fields as_dict maps, the results of
+         the different projections are cached separately.
+        """
+        key = (mapper_class, projection,
+               id(value) if self.key is None else self.key(value))
+        results = self._results
+        cached = results.get(key)
+        if cached is not None:
+            self.hits += 1
+            results.move_to_end(key)
+            return cached[1]
+        self.misses += 1
+        result = as_dict(value)
+        # The value is kept with the result, so that its identity is not
+        # reused by another object while cached.
+        results[key] = (value, result)
+        if self.maxsize is not None and len(results) > self.maxsize:
+            results.popitem(last=False)
+        return result
+
+    def wrap(self, mapper_class, as_dict, projection=None):
+        """Return as_dict looking up the cache first."""
+        return lambda value: self.get(
+            mapper_class, value, as_dict, projection)
+
+    def clear(self):
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
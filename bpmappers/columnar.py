@@ -0,0 +1,170 @@
+"""Columnar batch mapping of flat mappers.
+
+Mapper classes made only of ``RawField`` and ``ChoiceField`` (with or
+without callbacks) and without hook methods map a batch column by column:
+each field is read across all the objects at once and converted as a
+whole column, instead of calling ``as_dict()`` for each object::
+
+    from bpmappers.columnar import map_columns, map_rows
+
+    columns = map_columns(EventMapper, events)  # {'name': [...], ...}
+    rows = map_rows(EventMapper, events)  # [{'name': ...}, ...]
+
+The columns are lists, if NumPy is installed ``map_columns(...,
+arrays=True)`` returns NumPy arrays. The ChoiceField lookups of the
+columns read from the objects are done by ``ChoiceField.lookup_many()``,
+which is faster than converting the lists to NumPy arrays. Other mapper
+classes are mapped by ``Mapper.map_many()`` with the same results.
+"""
+from collections import OrderedDict
+from operator import attrgetter
+
+from bpmappers.compiler import INLINED_METHODS
+from bpmappers.fields import BaseField, RawField, ChoiceField
+from bpmappers.mappers import Mapper
+from bpmappers.projection import make_projection
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# as_value of the fields which can be converted as a column.
+COLUMNAR_VALUES = (RawField.as_value, ChoiceField.as_value)
+
+# numpy.dtype.kind of the columns whose ChoiceField lookups are vectorized.
+VECTORIZED_KINDS = 'biuU'
+
+
+def is_columnar(mapper_class):
+    """Return True if mapper_class can map the objects column by column.
+    """
+    for method_name in INLINED_METHODS + ('__init__',):
+        if getattr(mapper_class, method_name) is not \
+                getattr(Mapper, method_name):
+            return False
+    for entry in mapper_class._plan:
+        field_class = type(entry.field)
+        if entry.is_nonkey or not entry.key \
+                or entry.filter_name or entry.after_filter_name \
+                or entry.attach_name or entry.attach_parent \
+                or field_class.get_value is not BaseField.get_value \
+                or field_class.as_value not in COLUMNAR_VALUES:
+            return False
+    return True
+
+
+def _read_column(mapper, rows, entry, all_dicts):
+    accessor = entry.accessor
+    if len(accessor) == 1:
+        key = accessor[0]
+        if all_dicts:
+            column = [row.get(key) for row in rows]
+        else:
+            try:
+                column = list(map(attrgetter(key), rows))
+            except AttributeError:
+                # dicts or objects without the attribute
+                column = [mapper._getattr_path(row, accessor) for row in rows]
+    else:
+        column = [mapper._getattr_path(row, accessor) for row in rows]
+    if not entry.skip_callable:
+        column = [v() if hasattr(v, '__call__') else v for v in column]
+    return column
+
+
+def lookup_choices(field, column):
+    """Return the list of the results of ChoiceField for column.
+
+    If column is a NumPy array of integers, booleans or strings, each
+    distinct value is looked up once. Other columns are looked up by
+    ``ChoiceField.lookup_many()``.
+    """
+    if numpy is not None and isinstance(column, numpy.ndarray) \
+            and column.ndim == 1 and len(column) \
+            and column.dtype.kind in VECTORIZED_KINDS:
+        keys, inverse = numpy.unique(column, return_inverse=True)
+        table = numpy.empty(len(keys), dtype=object)
+        for i, value in enumerate(field.lookup_many(keys.tolist())):
+            table[i] = value
+        return table[inverse].tolist()
+    return field.lookup_many(column)
+
+
+def _convert_column(entry, column):
+    field = entry.field
+    if field._callback is not None:
+        column = list(map(field.callback_value, column))
+    if type(field).as_value is ChoiceField.as_value:
+        column = lookup_choices(field, column)
+    if field._after_callback is not None:
+        column = list(map(field.after_callback_value, column))
+    return column
+
+
+def _map_columns(mapper_class, rows, projection, options):
+    # Return the list of the names and the list of the columns.
+    mapper = mapper_class(None, **options)
+    all_dicts = all(isinstance(row, dict) for row in rows)
+    plan = mapper_class._plan
+    if projection is not None:
+        plan = mapper_class._projected_plan(projection)
+    columns = {}
+    for entry in plan:
+        columns[entry.name] = _convert_column(
+            entry, _read_column(mapper, rows, entry, all_dicts))
+    names = [name for name in mapper_class._meta.field_names
+             if name in columns]
+    return names, [columns[name] for name in names]
+
+
+def _columnar(mapper_class, rows):
+    # Objects which are lists are mapped from their items by as_dict().
+    return is_columnar(mapper_class) \
+        and not any(isinstance(row, list) for row in rows)
+
+
+def map_columns(mapper_class, iterable, arrays=False, only=None,
+                exclude=None, **options):
+    """Map the objects of iterable and return the results as columns.
+
+    :mapper_class: Mapper class to map each object with.
+    :iterable: Mapping source objects.
+    :arrays: If True and NumPy is installed, the columns are NumPy arrays
+     instead of lists.
+    :only: Names of the fields to map, see ``Mapper.as_dict()``.
+    :exclude: Names of the fields not to map.
+    :\\*\\*options: Optional values of the mapper.
+    :return: The dict_class instance mapping the names to the columns.
+    """
+    rows = list(iterable)
+    dict_class = options.get('dict_class', OrderedDict)
+    if _columnar(mapper_class, rows):
+        names, columns = _map_columns(
+            mapper_class, rows, make_projection(only, exclude), options)
+    else:
+        results = mapper_class.map_many(
+            rows, only=only, exclude=exclude, **options)
+        names = list(OrderedDict.fromkeys(
+            name for result in results for name in result))
+        columns = [[result.get(name) for result in results]
+                   for name in names]
+    if arrays and numpy is not None:
+        columns = [numpy.array(column) for column in columns]
+    return dict_class(zip(names, columns))
+
+
+def map_rows(mapper_class, iterable, only=None, exclude=None, **options):
+    """Map the objects of iterable column by column and return the list
+    of the results, which are the same as ``Mapper.map_many()``.
+    """
+    rows = list(iterable)
+    if not _columnar(mapper_class, rows):
+        return mapper_class.map_many(
+            rows, only=only, exclude=exclude, **options)
+    dict_class = options.get('dict_class', OrderedDict)
+    names, columns = _map_columns(
+        mapper_class, rows, make_projection(only, exclude), options)
+    if not names:
+        return [dict_class() for _row in rows]
+    return [dict_class(zip(names, values)) for values in zip(*columns)]
@@ -0,0 +1,130 @@
+"""Code generation engine of Mapper.
+
+Mapper classes with ``compiled = True`` get a specialized mapping function
+generated from their execution plan. The function has no per-field loop
+and no hook lookups, plain ``RawField`` values are read with attribute
+loads and returned as a single dict literal.
+"""
+import keyword
+from collections import OrderedDict
+
+from bpmappers.fields import BaseField, RawField
+
+# Mapper methods that the generated function inlines. If a mapper class
+# overrides one of them, it is mapped by the interpreter instead.
+INLINED_METHODS = (
+    'as_dict', 'order', 'key_name', '_getattr', '_getattr_path',
+    '_getattr_inner')
+
+
+def is_compilable(mapper_class, base_class):
+    """Return True if mapper_class can be compiled.
+
+    :base_class: The class providing the default implementation of the
+     methods in INLINED_METHODS.
+    """
+    for method_name in INLINED_METHODS:
+        if getattr(mapper_class, method_name) is not \
+                getattr(base_class, method_name):
+            return False
+    for entry in mapper_class._plan:
+        if entry.filter_name or entry.after_filter_name \
+                or entry.attach_name or entry.attach_parent or entry.shared:
+            return False
+    return True
+
+
+def _is_raw(field):
+    return (
+        type(field).as_value is RawField.as_value
+        and type(field).get_value is BaseField.get_value
+        and field._callback is None
+        and field._after_callback is None)
+
+
+def _attribute_load(key):
+    if key.isidentifier() and not keyword.iskeyword(key):
+        return 'data.%s' % key
+    return 'getattr(data, %r)' % key
+
+
+def generate_source(mapper_class):
+    """Generate the source code of the mapping function of mapper_class.
+
+    :return: Tuple of the source code and the namespace to execute it.
+    """
+    namespace = {'OrderedDict': OrderedDict}
+    plan = mapper_class._plan
+    field_names = mapper_class._meta.field_names
+    variables = {}
+    # attribute access
+    dict_lines = []
+    object_lines = []
+    dotted_lines = []
+    for i, entry in enumerate(plan):
+        var = 'v%d' % i
+        variables[entry.name] = var
+        key = entry.key
+        if entry.is_nonkey or not key:
+            dotted_lines.append('    %s = None' % var)
+        elif '.' in key:
+            dotted_lines.append('    %s = _getattr_path(data, %r)' % (
+                var, entry.accessor))
+        else:
+            dict_lines.append('        %s = get(%r)' % (var, key))
+            object_lines.extend([
+                '        try:',
+                '            %s = %s' % (var, _attribute_load(key)),
+                '        except AttributeError:',
+                '            %s = mapper._getattr_inner(data, %r)' % (
+                    var, key),
+            ])
+    lines = ['def as_dict(mapper, data):']
+    if dict_lines:
+        lines.append('    if isinstance(data, dict):')
+        lines.append('        get = data.get')
+        lines.extend(dict_lines)
+        lines.append('    else:')
+        lines.extend(object_lines)
+    if any('_getattr_path(' in line for line in dotted_lines):
+        lines.append('    _getattr_path = mapper._getattr_path')
+    lines.extend(dotted_lines)
+    # conversion
+    for i, entry in enumerate(plan):
+        var = 'v%d' % i
+        if not entry.is_nonkey and not entry.skip_callable:
+            lines.append("    if hasattr(%s, '__call__'):" % var)
+            lines.append('        %s = %s()' % (var, var))
+        if not _is_raw(entry.field):
+            field_var = 'field%d' % i
+            namespace[field_var] = entry.field
+            lines.append('    %s = %s.get_value(mapper, %s)' % (
+                var, field_var, var))
+    # result
+    names = [name for name in field_names if name in variables]
+    lines.append(
+        "    dict_class = mapper.options.get('dict_class', OrderedDict)")
+    lines.append('    if dict_class is dict:')
+    lines.append('        return {%s}' % ', '.join(
+        '%r: %s' % (name, variables[name]) for name in names))
+    lines.append('    return dict_class([%s])' % ', '.join(
+        '(%r, %s)' % (name, variables[name]) for name in names))
+    return '\n'.join(lines) + '\n', namespace
+
+
+def compile_mapper(mapper_class, base_class):
+    """Return the generated mapping function of mapper_class.
+
+    The function takes the mapper instance and the mapping source object.
+    None is returned when mapper_class is not compilable.
+    """
+    if not is_compilable(mapper_class, base_class):
+        return None
+    source, namespace = generate_source(mapper_class)
+    code = compile(
+        source, '<bpmappers compiled %s>' % mapper_class.__qualname__,
+        'exec')
+    exec(code, namespace)
+    func = namespace['as_dict']
+    func.source = source
+    return func
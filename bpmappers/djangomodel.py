@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from bpmappers.fields import Field, RawField, DelegateField, ListDelegateField
-from bpmappers.mappers import Options, BaseMapper, Mapper
+from bpmappers.mappers import (
+    Options, BaseMapper, Mapper, merge_options, overrides)
+from bpmappers.projection import make_projection
 
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from django.db import models
+from django.db.models.constants import LOOKUP_SEP
 
 
 class MetaModelError(Exception):
@@ -11,6 +14,8 @@ class MetaModelError(Exception):
 
 
 class DjangoFileField(Field):
+    __slots__ = ()
+
     def as_value(self, mapper, value):
         return value and value.url or None
 
@@ -31,17 +36,417 @@ DEFINED_MODEL_MAPPER_FIELDS = {
 }
 
 
+# Mapper classes generated by create_model_mapper.
+_model_mapper_cache = {}
+
+
+def _freeze(value):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return tuple(value.items())
+    return tuple(value)
+
+
 def create_model_mapper(model_class, model_fields=None, model_exclude=None,
                         model_mapper_fields=None):
+    """Return the ModelMapper class of model_class.
+
+    The generated classes are cached by the arguments, the related models
+    shared by many ModelMapper are generated only once.
+    """
+    cache_key = (
+        model_class, _freeze(model_fields), _freeze(model_exclude),
+        _freeze(model_mapper_fields))
+    mapper_class = _model_mapper_cache.get(cache_key)
+    if mapper_class is not None:
+        return mapper_class
+
     class _mapper_class(ModelMapper):
         class Meta:
             model = model_class
             fields = model_fields
             exclude = model_exclude
             mapper_fields = model_mapper_fields
+    _model_mapper_cache[cache_key] = _mapper_class
     return _mapper_class
 
 
+def clear_model_mapper_cache():
+    """Clear the cache of create_model_mapper."""
+    _model_mapper_cache.clear()
+
+
+def _relation_fields(model):
+    """Return the dict of the relation fields of model by accessor name."""
+    relations = {}
+    for field in model._meta.get_fields():
+        if not field.is_relation or field.related_model is None:
+            continue
+        if field.auto_created and not field.concrete:
+            # reverse relation
+            relations[field.get_accessor_name()] = field
+        else:
+            relations[field.name] = field
+    return relations
+
+
+def _plan_of(mapper_class):
+    # The plan of the lazy mapper classes is built by _prepare().
+    if getattr(mapper_class, '_lazy_pending', False):
+        mapper_class._prepare()
+    return mapper_class._plan
+
+
+def _projected_plan(mapper_class, projection):
+    plan = _plan_of(mapper_class)
+    if projection is None:
+        return plan
+    return mapper_class._projected_plan(projection)
+
+
+def _collect_related_lookups(mapper_class, model, prefix, prefetched,
+                             select_related, prefetch_related, seen,
+                             projection=None):
+    if (mapper_class, model) in seen:
+        return
+    seen = seen | {(mapper_class, model)}
+    relations = _relation_fields(model)
+    for entry in _projected_plan(mapper_class, projection):
+        if entry.is_nonkey or not entry.accessor:
+            continue
+        path = list(prefix)
+        related_model = model
+        in_prefetch = prefetched
+        current_relations = relations
+        for name in entry.accessor:
+            field = current_relations.get(name)
+            if field is None:
+                # Not a relation, e.g. a column or a property.
+                related_model = None
+                break
+            path.append(name)
+            if field.many_to_many or field.one_to_many:
+                in_prefetch = True
+            lookup = LOOKUP_SEP.join(path)
+            lookups = prefetch_related if in_prefetch else select_related
+            if lookup not in lookups:
+                lookups.append(lookup)
+            related_model = field.related_model
+            current_relations = _relation_fields(related_model)
+        child_mapper_class = getattr(entry.field, 'mapper_class', None)
+        if related_model is not None \
+                and hasattr(child_mapper_class, '_plan'):
+            _collect_related_lookups(
+                child_mapper_class, related_model, path, in_prefetch,
+                select_related, prefetch_related, seen,
+                getattr(entry.field, 'projection', None))
+
+
+def related_lookups(mapper_class, model, projection=None):
+    """Return the lookups to load the relations mapper_class reads.
+
+    The relations are collected from the keys of the fields, including
+    dot splited keys and the fields of the delegated mapper classes.
+
+    :projection: The projection made by make_projection(), the relations
+     of the fields it excludes are not loaded.
+    :return: Tuple of the lists of the select_related() lookups and the
+     prefetch_related() lookups.
+    """
+    select_related = []
+    prefetch_related = []
+    _collect_related_lookups(
+        mapper_class, model, [], False, select_related, prefetch_related,
+        frozenset(), projection)
+    return select_related, prefetch_related
+
+
+class ColumnsNotSupported(Exception):
+    "The columns the mapper reads can not be determined"
+
+
+def _model_field(model, name, entry):
+    relation = _relation_fields(model).get(name)
+    if relation is not None:
+        return relation
+    try:
+        # get_field() also finds the ForeignKey by its attname.
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # e.g. a property or a method
+        raise ColumnsNotSupported('%s.%s' % (model.__name__, entry.name))
+
+
+def _add_lookup(columns, path):
+    lookup = LOOKUP_SEP.join(path)
+    if lookup not in columns:
+        columns.append(lookup)
+
+
+def _collect_columns(mapper_class, model, prefix, projection, columns,
+                     seen):
+    if (mapper_class, model) in seen:
+        return
+    seen = seen | {(mapper_class, model)}
+    if overrides(mapper_class, '_getattr') \
+            or overrides(mapper_class, '_getattr_inner'):
+        raise ColumnsNotSupported('Custom attribute access')
+    for entry in _projected_plan(mapper_class, projection):
+        hook_name = entry.filter_name or entry.after_filter_name \
+            or entry.attach_name
+        if hook_name:
+            # The hooks may read the model instance from Mapper.data.
+            raise ColumnsNotSupported(hook_name)
+        if entry.is_nonkey or not entry.accessor:
+            continue
+        current_model = model
+        path = list(prefix)
+        for name in entry.accessor:
+            model_field = _model_field(current_model, name, entry)
+            if model_field.many_to_many or model_field.one_to_many:
+                # Loaded by prefetch_related() with the primary key.
+                break
+            if not model_field.concrete:
+                # reverse OneToOneField
+                raise ColumnsNotSupported(
+                    '%s.%s' % (current_model.__name__, entry.name))
+            path.append(model_field.name)
+            _add_lookup(columns, path)
+            if not model_field.is_relation or name != model_field.name:
+                # a column, or the ForeignKey value by its attname
+                break
+            current_model = model_field.related_model
+        else:
+            # The key ends with a related object.
+            field = entry.field
+            child_mapper_class = getattr(field, 'mapper_class', None)
+            if child_mapper_class is not None \
+                    and (field._before_filter is not None
+                         or field._callback is not None):
+                # They may read any attribute of the related object.
+                raise ColumnsNotSupported(entry.name)
+            if hasattr(child_mapper_class, '_plan'):
+                _collect_columns(
+                    child_mapper_class, current_model, path,
+                    getattr(field, 'projection', None), columns, seen)
+            else:
+                for model_field in current_model._meta.concrete_fields:
+                    _add_lookup(columns, path + [model_field.name])
+
+
+def only_columns(mapper_class, model, projection=None):
+    """Return the lookups of the columns mapper_class reads for
+    ``QuerySet.only()``.
+
+    The columns of the related models loaded by select_related() are
+    included with the ForeignKey fields themselves. The columns of the
+    relations loaded by prefetch_related() are not restricted.
+
+    :projection: The projection made by make_projection().
+    :raises ColumnsNotSupported: if mapper_class may read any attribute of
+     the model instances, e.g. with filter hooks or properties.
+    """
+    columns = []
+    _collect_columns(
+        mapper_class, model, [], projection, columns, frozenset())
+    return columns
+
+
+class ValuesNotSupported(Exception):
+    "The mapper can not map the rows of QuerySet.values()"
+
+
+class _ValuesNode(object):
+    """Mapping source dict built from the columns of a values row."""
+    def __init__(self, lookup=None):
+        # lookup of the relation, its value is None if the relation is null.
+        self.lookup = lookup
+        self.columns = {}
+        self.relations = {}
+
+    def relation(self, name, lookup):
+        if name not in self.relations:
+            self.relations[name] = _ValuesNode(lookup)
+        return self.relations[name]
+
+    def lookups(self):
+        lookups = list(self.columns.values())
+        for node in self.relations.values():
+            lookups.append(node.lookup)
+            lookups.extend(node.lookups())
+        return lookups
+
+    def builder(self, indexes):
+        """Return the function building the source dict from a row tuple.
+        """
+        columns = [
+            (name, indexes[lookup]) for name, lookup in self.columns.items()]
+        relations = [
+            (name, indexes[node.lookup], node.builder(indexes))
+            for name, node in self.relations.items()]
+
+        def build(row):
+            source = {name: row[index] for name, index in columns}
+            for name, index, build_relation in relations:
+                if row[index] is None:
+                    source[name] = None
+                else:
+                    source[name] = build_relation(row)
+            return source
+        return build
+
+
+def _forward_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        raise ValuesNotSupported('%s.%s' % (model.__name__, name))
+    if not field.concrete or not (field.many_to_one or field.one_to_one) \
+            or name != field.name:
+        raise ValuesNotSupported('%s.%s' % (model.__name__, name))
+    return field
+
+
+def _collect_values(mapper_class, model, node, prefix, seen):
+    if (mapper_class, model) in seen:
+        raise ValuesNotSupported('Recursive mapper %r' % mapper_class)
+    seen = seen | {(mapper_class, model)}
+    if overrides(mapper_class, '_getattr') \
+            or overrides(mapper_class, '_getattr_inner'):
+        raise ValuesNotSupported('Custom attribute access')
+    for entry in _plan_of(mapper_class):
+        hook_name = entry.filter_name or entry.after_filter_name \
+            or entry.attach_name
+        if hook_name:
+            # The hooks may read the model instance from Mapper.data.
+            raise ValuesNotSupported(hook_name)
+        if entry.is_nonkey:
+            continue
+        field = entry.field
+        if isinstance(field, ListDelegateField) or not entry.accessor:
+            raise ValuesNotSupported(entry.name)
+        current_model = model
+        current_node = node
+        path = list(prefix)
+        for name in entry.accessor[:-1]:
+            relation = _forward_relation(current_model, name)
+            path.append(name)
+            current_node = current_node.relation(
+                name, LOOKUP_SEP.join(path))
+            current_model = relation.related_model
+        name = entry.accessor[-1]
+        path.append(name)
+        lookup = LOOKUP_SEP.join(path)
+        if isinstance(field, DelegateField):
+            if field._before_filter is not None \
+                    or field._callback is not None:
+                raise ValuesNotSupported(entry.name)
+            relation = _forward_relation(current_model, name)
+            _collect_values(
+                field.mapper_class, relation.related_model,
+                current_node.relation(name, lookup), path, seen)
+            continue
+        try:
+            model_field = current_model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValuesNotSupported(entry.name)
+        if not model_field.concrete \
+                or isinstance(model_field, models.FileField) \
+                or name != model_field.attname:
+            raise ValuesNotSupported(entry.name)
+        current_node.columns[name] = lookup
+
+
+def values_plan(mapper_class, model):
+    """Return the lookups and the source builder for QuerySet.values_list().
+
+    The builder makes the nested dict mapping source, which mapper_class
+    maps to the same result as the model instance, from a row tuple of
+    ``values_list(*lookups)``.
+
+    :raises ValuesNotSupported: if mapper_class reads any value which
+     can not be fetched as a column, e.g. properties, FileField or
+     ManyToManyField.
+    """
+    root = _ValuesNode()
+    _collect_values(mapper_class, model, root, [], frozenset())
+    lookups = []
+    for lookup in root.lookups():
+        if lookup not in lookups:
+            lookups.append(lookup)
+    indexes = {lookup: i for i, lookup in enumerate(lookups)}
+    return lookups, root.builder(indexes)
+
+
+def add_model_fields(opt, mapper_meta):
+    """Add the fields generated from the model of mapper_meta to opt."""
+    model = getattr(mapper_meta, 'model', None)
+    # Meta.mapper_fields
+    mapper_fields = getattr(mapper_meta, 'mapper_fields', None)
+    defined_fields = DEFINED_MODEL_MAPPER_FIELDS.copy()
+    if mapper_fields:
+        defined_fields.update(mapper_fields)
+    # Meta.modelが無い場合はエラー
+    if model is None:
+        raise MetaModelError
+    for model_field in model._meta.fields + model._meta.many_to_many:
+        # Meta.fields
+        if hasattr(mapper_meta, 'fields'):
+            if mapper_meta.fields is not None \
+                    and model_field.name not in mapper_meta.fields:
+                continue
+        # Meta.exclude
+        if hasattr(mapper_meta, 'exclude'):
+            if mapper_meta.exclude is not None \
+                    and model_field.name in mapper_meta.exclude:
+                continue
+        # モデルのフィールドに対応したField追加
+        if model_field.remote_field:
+            # 同じモデルを参照しようとした場合はスキップする
+            if model == model_field.remote_field.model:
+                continue
+            if isinstance(model_field, models.ForeignKey):
+                # ForeignKey
+                related_model_mapper = create_model_mapper(
+                    model_field.remote_field.model,
+                    model_mapper_fields=mapper_fields)
+                opt.add_field(
+                    model_field.name,
+                    DelegateField(
+                        related_model_mapper,
+                        key=model_field.name,
+                        required=not model_field.null))
+            elif isinstance(model_field, models.ManyToManyField):
+                # ManyToManyField
+                related_model_mapper = create_model_mapper(
+                    model_field.remote_field.model,
+                    model_mapper_fields=mapper_fields)
+                opt.add_field(
+                    model_field.name,
+                    ListDelegateField(
+                        related_model_mapper,
+                        key=model_field.name,
+                        filter=lambda manager: manager.all()))
+        else:
+            for defined_field in defined_fields:
+                if isinstance(model_field, defined_field):
+                    mapper_field = defined_fields[defined_field]
+                    opt.add_field(
+                        model_field.name,
+                        mapper_field(key=model_field.name))
+                    break
+            else:
+                # If there is no match field, use default.
+                opt.add_field(
+                    model_field.name,
+                    DEFAULT_MAPPER_FIELD(key=model_field.name))
+
+
+# Class attributes of ModelMapper caching the query plans.
+QUERY_PLAN_CACHES = ('_related_lookups', '_only_columns', '_values_plan')
+
+
 class ModelMapperMetaclass(BaseMapper):
     def __new__(cls, name, bases, attrs):
         if '_meta' not in attrs:
@@ -49,73 +454,56 @@ class ModelMapperMetaclass(BaseMapper):
             attrs['_meta'] = opt
         else:
             opt = attrs['_meta']
-        # BaseMapperの処理が後に来るので
-        # ここで先にoptを拡張する
         mapper_meta = attrs.get('Meta')
         if mapper_meta is not None:
-            model = getattr(mapper_meta, 'model', None)
-            # Meta.mapper_fields
-            mapper_fields = getattr(mapper_meta, 'mapper_fields', None)
-            defined_fields = DEFINED_MODEL_MAPPER_FIELDS.copy()
-            if mapper_fields:
-                defined_fields.update(mapper_fields)
             # Meta.modelが無い場合はエラー
-            if model is None:
+            if getattr(mapper_meta, 'model', None) is None:
                 raise MetaModelError
-            for model_field in model._meta.fields + model._meta.many_to_many:
-                # Meta.fields
-                if hasattr(mapper_meta, 'fields'):
-                    if mapper_meta.fields is not None \
-                            and model_field.name not in mapper_meta.fields:
-                        continue
-                # Meta.exclude
-                if hasattr(mapper_meta, 'exclude'):
-                    if mapper_meta.exclude is not None \
-                            and model_field.name in mapper_meta.exclude:
-                        continue
-                # モデルのフィールドに対応したField追加
-                if model_field.remote_field:
-                    # 同じモデルを参照しようとした場合はスキップする
-                    if model == model_field.remote_field.model:
-                        continue
-                    if isinstance(model_field, models.ForeignKey):
-                        # ForeignKey
-                        related_model_mapper = create_model_mapper(
-                            model_field.remote_field.model,
-                            model_mapper_fields=mapper_fields)
-                        opt.add_field(
-                            model_field.name,
-                            DelegateField(
-                                related_model_mapper,
-                                key=model_field.name,
-                                required=not model_field.null))
-                    elif isinstance(model_field, models.ManyToManyField):
-                        # ManyToManyField
-                        related_model_mapper = create_model_mapper(
-                            model_field.remote_field.model,
-                            model_mapper_fields=mapper_fields)
-                        opt.add_field(
-                            model_field.name,
-                            ListDelegateField(
-                                related_model_mapper,
-                                key=model_field.name,
-                                filter=lambda manager: manager.all()))
-                else:
-                    for defined_field in defined_fields:
-                        if isinstance(model_field, defined_field):
-                            mapper_field = defined_fields[defined_field]
-                            opt.add_field(
-                                model_field.name,
-                                mapper_field(key=model_field.name))
-                            break
-                    else:
-                        # If there is no match field, use default.
-                        opt.add_field(
-                            model_field.name,
-                            DEFAULT_MAPPER_FIELD(key=model_field.name))
+            lazy = getattr(mapper_meta, 'lazy', False)
+        else:
+            # Subclasses of the lazy mapper are also lazy.
+            lazy = any(
+                getattr(base_class, '_lazy_pending', False)
+                for base_class in bases)
+        if not lazy:
+            for base_class in bases:
+                if getattr(base_class, '_lazy_pending', False):
+                    base_class._prepare()
+            # BaseMapperの処理が後に来るので
+            # ここで先にoptを拡張する
+            if mapper_meta is not None:
+                add_model_fields(opt, mapper_meta)
         attrs['_meta'] = opt
+        attrs['_lazy_pending'] = lazy
         return BaseMapper.__new__(cls, name, bases, attrs)
 
+    def __call__(cls, *args, **kwargs):
+        if cls._lazy_pending:
+            cls._prepare()
+        return super(ModelMapperMetaclass, cls).__call__(*args, **kwargs)
+
+    def _rebuild_plan(cls):
+        # The cached query plans are built from the plan.
+        for name in QUERY_PLAN_CACHES:
+            if name in cls.__dict__:
+                type.__delattr__(cls, name)
+        super(ModelMapperMetaclass, cls)._rebuild_plan()
+
+    def _prepare(cls):
+        """Populate _meta of the lazy mapper class with the model fields.
+        """
+        for base_class in cls.__bases__:
+            if getattr(base_class, '_lazy_pending', False):
+                base_class._prepare()
+        opt = Options()
+        mapper_meta = cls.__dict__.get('Meta')
+        if mapper_meta is not None:
+            add_model_fields(opt, mapper_meta)
+        merge_options(opt, cls.__bases__, cls.__dict__)
+        cls._meta = opt
+        cls._rebuild_plan()
+        cls._lazy_pending = False
+
 
 class ModelMapper(Mapper, metaclass=ModelMapperMetaclass):
     """
@@ -123,14 +511,140 @@ class ModelMapper(Mapper, metaclass=ModelMapperMetaclass):
 
     This class generates mapping definition with using Django Model's Meta
      data.
+
+    If ``Meta.lazy`` is True, the definition is generated when the class
+    is instantiated first, instead of when the class is created.
     """
 
-    def _getattr(self, obj, key):
+    @classmethod
+    def get_model(cls):
+        """Return the model class of Meta.model."""
+        return getattr(getattr(cls, 'Meta', None), 'model', None)
+
+    @classmethod
+    def _cached(cls, name, projection, func):
+        # Cache the result of func(cls, model, projection) in the class.
+        if cls._lazy_pending:
+            cls._prepare()
+        cache = cls.__dict__.get(name)
+        if cache is None:
+            cache = {}
+            setattr(cls, name, cache)
+        if projection not in cache:
+            cache[projection] = func(cls, cls.get_model(), projection)
+        return cache[projection]
+
+    @classmethod
+    def related_lookups(cls, only=None, exclude=None):
+        """
+        Return the select_related() and prefetch_related() lookups for
+        the relations this mapper reads.
+
+        :only: Paths of the fields to map, see Mapper.as_dict().
+        :exclude: Paths of the fields not to map.
+        """
+        return cls._cached(
+            '_related_lookups', make_projection(only, exclude),
+            related_lookups)
+
+    @classmethod
+    def only_columns(cls, only=None, exclude=None):
+        """
+        Return the only_columns() lookups of this mapper, or None if the
+        columns this mapper reads can not be determined.
+
+        :only: Paths of the fields to map, see Mapper.as_dict().
+        :exclude: Paths of the fields not to map.
+        """
+        def columns(cls, model, projection):
+            try:
+                return only_columns(cls, model, projection)
+            except ColumnsNotSupported:
+                return None
+        return cls._cached(
+            '_only_columns', make_projection(only, exclude), columns)
+
+    @classmethod
+    def prepare_queryset(cls, queryset, only=None, exclude=None,
+                         defer=False):
+        """
+        Apply select_related() and prefetch_related() to queryset, so that
+        mapping the objects does not query the relations one by one.
+
+        :only: Paths of the fields to map, see Mapper.as_dict().
+        :exclude: Paths of the fields not to map.
+        :defer: If True, also apply ``only()`` with only_columns(), so
+         that the columns this mapper does not read are not loaded.
+        """
+        select_related, prefetch_related = cls.related_lookups(
+            only, exclude)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if defer:
+            columns = cls.only_columns(only, exclude)
+            if columns:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    @classmethod
+    def map_queryset(cls, queryset, stream=False, only=None, exclude=None,
+                     defer=False, **options):
+        """
+        Map the objects of queryset prepared by prepare_queryset().
+        """
+        return cls.map_many(
+            cls.prepare_queryset(queryset, only, exclude, defer),
+            stream=stream, only=only, exclude=exclude, **options)
+
+    @classmethod
+    def values_plan(cls):
+        """
+        Return the values_plan() of this mapper, or None if this mapper
+        can not map values rows.
+        """
+        if cls._lazy_pending:
+            cls._prepare()
+        if '_values_plan' not in cls.__dict__:
+            try:
+                plan = values_plan(cls, cls.get_model())
+            except ValuesNotSupported:
+                plan = None
+            cls._values_plan = plan
+        return cls._values_plan
+
+    @classmethod
+    def map_values(cls, queryset, stream=False, **options):
+        """
+        Map the rows of ``queryset.values_list()`` instead of model
+        instances.
+
+        Only the columns this mapper reads are fetched, including the
+        columns of the related models of ForeignKey. The results are the
+        same as mapping the instances. If this mapper reads anything
+        other than columns, map_queryset() is used instead.
+        """
+        plan = cls.values_plan()
+        if plan is None:
+            return cls.map_queryset(queryset, stream=stream, **options)
+        lookups, build = plan
+        sources = map(build, queryset.values_list(*lookups))
+        return cls.map_many(sources, stream=stream, **options)
+
+    def _getattr_path(self, obj, path):
         """
         Hooks attribute access.
         """
         # If access the empty FK value, return None.
         try:
-            return super(ModelMapper, self)._getattr(obj, key)
+            return super(ModelMapper, self)._getattr_path(obj, path)
+        except ObjectDoesNotExist:
+            return None
+
+    def _getattr_path_cached(self, obj, path, shared, cache):
+        try:
+            return super(ModelMapper, self)._getattr_path_cached(
+                obj, path, shared, cache)
         except ObjectDoesNotExist:
             return None
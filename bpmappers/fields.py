@@ -1,7 +1,44 @@
+import asyncio
+from collections.abc import Mapping
+from enum import Enum
+from inspect import isawaitable
+
 from bpmappers.exceptions import InvalidDelegateException
+from bpmappers.projection import PROJECTION_OPTION
+
+
+def _batch_as_dict(mapper_class, options):
+    """Return the function mapping one value with mapper_class.
+
+    Mapper classes share one mapper instance for all the values, other
+    classes are instantiated for each value.
+    """
+    batch_as_dict = getattr(mapper_class, '_batch_as_dict', None)
+    if batch_as_dict is None:
+        return lambda value: mapper_class(value, **options).as_dict()
+    return batch_as_dict(options)
+
+
+async def _as_dict_async(mapper_class, value, options):
+    mapper = mapper_class(value, **options)
+    as_dict_async = getattr(mapper, 'as_dict_async', None)
+    if as_dict_async is None:
+        return mapper.as_dict()
+    return await as_dict_async()
+
+
+async def _resolve(value):
+    if isawaitable(value):
+        return await value
+    return value
 
 
 class BaseField(object):
+    # Fields are created for every column of the generated ModelMappers,
+    # subclasses declare __slots__ to keep them small. Subclasses without
+    # __slots__ get the instance dict as usual.
+    __slots__ = ('key', '_callback', '_after_callback')
+
     def __init__(self, callback=None, after_callback=None, *args, **kwargs):
         self.key = None
         self._callback = callback
@@ -24,6 +61,15 @@ class BaseField(object):
     def as_value(self, mapper, value):
         raise NotImplementedError
 
+    async def get_value_async(self, mapper, value):
+        """Coroutine version of get_value(), awaits awaitable values."""
+        value = await _resolve(self.callback_value(value))
+        value = await _resolve(await self.as_value_async(mapper, value))
+        return await _resolve(self.after_callback_value(value))
+
+    async def as_value_async(self, mapper, value):
+        return self.as_value(mapper, value)
+
     @property
     def is_nonkey(self):
         raise NotImplementedError
@@ -32,6 +78,8 @@ class BaseField(object):
 class NonKeyField(BaseField):
     """Result values are generated manually.
     """
+    __slots__ = ()
+
     def as_value(self, mapper, value=None):
         return value
 
@@ -43,6 +91,8 @@ class NonKeyField(BaseField):
 class StubField(NonKeyField):
     """Result values are fixed value.
     """
+    __slots__ = ('stub',)
+
     def __init__(self, stub={}, *args, **kwargs):
         self.stub = stub
         super(StubField, self).__init__(*args, **kwargs)
@@ -54,6 +104,8 @@ class StubField(NonKeyField):
 class Field(BaseField):
     """Basic class of Field.
     """
+    __slots__ = ('skip_callable',)
+
     def __init__(self, key=None, callback=None, skip_callable=False,
                  *args, **kwargs):
         super(Field, self).__init__(callback, *args, **kwargs)
@@ -68,25 +120,99 @@ class Field(BaseField):
 class RawField(Field):
     """Result values are obtained from mapping source without conversion.
     """
+    __slots__ = ()
+
     def as_value(self, mapper, value):
         return value
 
 
+# Default value of ChoiceField meaning no default.
+_MISSING = object()
+
+
+def _is_pairs(choices):
+    if not isinstance(choices, (list, tuple)) or not choices:
+        return False
+    return all(
+        isinstance(item, (list, tuple)) and len(item) == 2
+        for item in choices)
+
+
+def choices_table(choices):
+    """Return the dict mapping the keys to the values of choices.
+
+    :choices: Mapping, Enum class, or sequence of pairs like the choices of
+     Django model fields, including the named groups. Other objects, e.g.
+     a list of the values indexed by integers, are returned as they are.
+    """
+    if isinstance(choices, Mapping):
+        return choices
+    if isinstance(choices, type) and issubclass(choices, Enum):
+        # The member names are looked up by choices[name] as before, the
+        # values of the members take precedence.
+        table = dict(choices.__members__)
+        for member in choices:
+            label = getattr(member, 'label', member.name)
+            table[member] = label
+            table[member.value] = label
+        return table
+    if not _is_pairs(choices):
+        return choices
+    table = {}
+    for key, value in choices:
+        if _is_pairs(value):
+            # named group
+            table.update(choices_table(value))
+        else:
+            table[key] = value
+    return table
+
+
 class ChoiceField(Field):
+    """Result values are looked up in choices.
+
+    choices is a mapping, an Enum class, a sequence of pairs or any object
+    looked up by ``choices[value]``. The members of the Enum class and
+    their values are mapped to their ``label``, or to their name if they
+    have no label, and the names are mapped to the members as before.
+    KeyError (IndexError for a sequence) is raised for the value not in
+    choices, unless default is given.
+    """
+    __slots__ = ('choices', 'default', '_table')
+
     def __init__(self, choices, key=None, callback=None, skip_callable=False,
-                 *args, **kwargs):
+                 *args, default=_MISSING, **kwargs):
         super(ChoiceField, self).__init__(
             key, callback, skip_callable, *args, **kwargs)
         self.choices = choices
+        self.default = default
+        self._table = choices_table(choices)
 
     def as_value(self, mapper, value):
-        # TODO: 2-value tuple iterator
-        return self.choices[value]
+        try:
+            return self._table[value]
+        except LookupError:
+            if self.default is _MISSING:
+                raise
+            return self.default
+
+    def lookup_many(self, values):
+        """Return the list of the results of the values."""
+        table = self._table
+        if self.default is _MISSING:
+            return list(map(table.__getitem__, values))
+        if not isinstance(table, Mapping):
+            return [self.as_value(None, value) for value in values]
+        get = table.get
+        default = self.default
+        return [get(value, default) for value in values]
 
 
 class DelegateField(Field):
     """It is Field delegating mapping to the mapper_class.
     """
+    __slots__ = ('_before_filter', 'mapper_class', 'required', 'attach_parent')
+
     def __init__(self, mapper_class, key=None, callback=None,
                  skip_callable=True, before_filter=None, required=True,
                  attach_parent=False, *args, **kwargs):
@@ -102,26 +228,68 @@ class DelegateField(Field):
             return self._before_filter(value)
         return value
 
-    def as_value(self, mapper, value):
-        val = self.before_filter(value)
-        if val is None:
-            if not self.required:
-                return
+    def delegate_value(self, mapper, value):
+        """Return the value to be mapped by mapper_class.
+
+        None is returned when the value is empty and not required.
+        """
+        return self.check_required(mapper, self.before_filter(value))
+
+    def check_required(self, mapper, val):
+        if val is None and self.required:
             raise InvalidDelegateException(
                 'Invalid delegate "%(key)s" key in %(mapper)s.' % {
                     'key': self.key, 'mapper': mapper})
-        return self.mapper_class(val, **mapper.options).as_dict()
+        return val
+
+    def map_value(self, mapper, value):
+        """Map value with mapper_class.
+
+        The result is looked up in the ``delegate_cache`` option first, if
+        it is given.
+        """
+        options = mapper.options
+        cache = options.get('delegate_cache')
+        if cache is None:
+            return self.mapper_class(value, **options).as_dict()
+        return cache.get(
+            self.mapper_class, value,
+            lambda v: self.mapper_class(v, **options).as_dict(),
+            options.get(PROJECTION_OPTION))
+
+    def as_value(self, mapper, value):
+        val = self.delegate_value(mapper, value)
+        if val is None:
+            return
+        return self.map_value(mapper, val)
+
+    async def delegate_value_async(self, mapper, value):
+        return self.check_required(
+            mapper, await _resolve(self.before_filter(value)))
+
+    async def as_value_async(self, mapper, value):
+        val = await self.delegate_value_async(mapper, value)
+        if val is None:
+            return
+        return await _as_dict_async(self.mapper_class, val, mapper.options)
 
 
 class ListDelegateField(DelegateField):
     """Delegate mapping to mapper_class the value as list.
+
+    If lazy is True, the value is a generator and the items are mapped
+    as it is consumed.
     """
+    __slots__ = ('_filter', '_after_filter', 'lazy')
+
     def __init__(self, mapper_class, key=None, callback=None, filter=None,
-                 skip_callable=True, after_filter=None, *args, **kwargs):
+                 skip_callable=True, after_filter=None, *args, lazy=False,
+                 **kwargs):
         super(ListDelegateField, self).__init__(
             mapper_class, key, callback, skip_callable, *args, **kwargs)
         self._filter = filter
         self._after_filter = after_filter
+        self.lazy = lazy
 
     def filter(self, value):
         if self._filter:
@@ -133,22 +301,49 @@ class ListDelegateField(DelegateField):
             return self._after_filter(value)
         return value
 
+    def iter_values(self, mapper, value):
+        as_dict = _batch_as_dict(self.mapper_class, mapper.options)
+        cache = mapper.options.get('delegate_cache')
+        if cache is not None:
+            as_dict = cache.wrap(
+                self.mapper_class, as_dict,
+                mapper.options.get(PROJECTION_OPTION))
+        for v in value:
+            val = self.delegate_value(mapper, self.callback_value(v))
+            if val is not None:
+                val = as_dict(val)
+            yield self.after_filter(val)
+
     def as_value(self, mapper, value):
-        parsed = []
         value = self.filter(value)
         if value is None:
             if not self.required:
                 return
-        # TODO: use iterator
-        for v in value:
-            parsed.append(self.after_filter(
-                super(ListDelegateField, self).as_value(
-                    mapper, self.callback_value(v))
-            ))
-        return parsed
+        values = self.iter_values(mapper, value)
+        if self.lazy:
+            return values
+        return list(values)
+
+    async def _item_value_async(self, mapper, value):
+        value = await _resolve(self.callback_value(value))
+        val = await self.delegate_value_async(mapper, value)
+        if val is not None:
+            val = await _as_dict_async(self.mapper_class, val, mapper.options)
+        return await _resolve(self.after_filter(val))
+
+    async def as_value_async(self, mapper, value):
+        # The items are mapped concurrently, the result is always a list.
+        value = await _resolve(self.filter(value))
+        if value is None:
+            if not self.required:
+                return
+        return list(await asyncio.gather(
+            *[self._item_value_async(mapper, v) for v in value]))
 
 
 class NonKeyDelegateField(NonKeyField):
+    __slots__ = ('mapper_class', 'attach_parent')
+
     def __init__(self, mapper_class, callback=None, attach_parent=False,
                  *args, **kwargs):
         super(NonKeyDelegateField, self).__init__(callback, *args, **kwargs)
@@ -158,14 +353,25 @@ class NonKeyDelegateField(NonKeyField):
     def as_value(self, mapper, value=None):
         return self.mapper_class(value, **mapper.options).as_dict()
 
+    async def as_value_async(self, mapper, value=None):
+        return await _as_dict_async(self.mapper_class, value, mapper.options)
+
 
 class NonKeyListDelegateField(NonKeyDelegateField):
+    """Delegate mapping to mapper_class the value as list.
+
+    If lazy is True, the value is a generator and the items are mapped
+    as it is consumed.
+    """
+    __slots__ = ('_filter', '_after_filter', 'lazy')
+
     def __init__(self, mapper_class, callback=None, filter=None,
-                 after_filter=None, *args, **kwargs):
+                 after_filter=None, *args, lazy=False, **kwargs):
         super(NonKeyListDelegateField, self).__init__(
             mapper_class, callback, *args, **kwargs)
         self._filter = filter
         self._after_filter = after_filter
+        self.lazy = lazy
 
     def filter(self, value=None):
         if self._filter:
@@ -177,11 +383,24 @@ class NonKeyListDelegateField(NonKeyDelegateField):
             return self._after_filter(value)
         return value
 
-    def as_value(self, mapper, value=[]):
-        parsed = []
-        value = self.filter(value)
+    def iter_values(self, mapper, value):
+        as_dict = _batch_as_dict(self.mapper_class, mapper.options)
         for v in value:
-            parsed.append(self.after_filter(
-                super(NonKeyListDelegateField, self).as_value(
-                    mapper, self.callback_value(v))))
-        return parsed
+            yield self.after_filter(as_dict(self.callback_value(v)))
+
+    def as_value(self, mapper, value=[]):
+        values = self.iter_values(mapper, self.filter(value))
+        if self.lazy:
+            return values
+        return list(values)
+
+    async def _item_value_async(self, mapper, value):
+        value = await _resolve(self.callback_value(value))
+        value = await _as_dict_async(self.mapper_class, value, mapper.options)
+        return await _resolve(self.after_filter(value))
+
+    async def as_value_async(self, mapper, value=[]):
+        # The items are mapped concurrently, the result is always a list.
+        value = await _resolve(self.filter(value))
+        return list(await asyncio.gather(
+            *[self._item_value_async(mapper, v) for v in value]))
@@ -1,81 +1,265 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import copy
-from collections import OrderedDict, defaultdict
+from collections import Counter, OrderedDict, deque, namedtuple
+from inspect import isawaitable
+from itertools import islice
 
-from bpmappers.utils import sort_dict_with_keys
+from bpmappers import profiling
+from bpmappers.compiler import INLINED_METHODS, compile_mapper
+from bpmappers.projection import (
+    PROJECTION_OPTION, PROJECTED_PLANS_SIZE, make_projection, project_plan,
+    unwrap_field)
+from bpmappers.utils import (
+    key_positions, sort_dict_with_positions, split_key)
 from bpmappers.fields import Field, BaseField
 from bpmappers.exceptions import DataError
 
 
 class Options(object):
     """Meta data of Mapper.
+
+    ``fields`` maps each key to the tuple of the (name, field) pairs in the
+    mapping order, ``field_names`` lists the names in the result order.
     """
+    __slots__ = ('fields', 'field_names', '_keys')
+
     def __init__(self, *args, **kwargs):
-        self.fields = defaultdict(list)
-        # Use this list to checking for existing name.
+        self.fields = {}
         self.field_names = []
+        # Key of each registered name, to find the existing name in O(1).
+        self._keys = {}
 
     def add_field(self, name, field):
         """Add field"""
         if isinstance(field, Field) and field.key is None:
             field.key = name
-        if name in self.field_names:
+        fields = self.fields
+        if name in self._keys:
             # if the field is already registered, remove it.
-            lst = self.fields[field.key]
-            self.fields[field.key] = [tp for tp in lst if tp[0] != name]
-            for key in list(self.fields.keys()):
-                lst = self.fields[key]
-                updated_lst = [tp for tp in lst if tp[0] != name]
-                if updated_lst:
-                    self.fields[key] = [tp for tp in lst if tp[0] != name]
-                else:
-                    del self.fields[key]
+            old_key = self._keys[name]
+            pairs = tuple(tp for tp in fields[old_key] if tp[0] != name)
+            if pairs:
+                fields[old_key] = pairs
+            else:
+                del fields[old_key]
         else:
             self.field_names.append(name)
-        self.fields[field.key].append((name, field))
+        self._keys[name] = field.key
+        fields[field.key] = fields.get(field.key, ()) + ((name, field),)
 
     def copy(self):
         opt = Options()
         opt.fields = copy(self.fields)
         opt.field_names = copy(self.field_names)
+        opt._keys = copy(self._keys)
         return opt
 
     def __repr__(self):
         return '<Options: %s>' % self.fields
 
 
+# Returned by Mapper._probe_path() if the object does not have the path.
+MISSING = object()
+
+# Methods of Mapper reading the values from the mapping source.
+ACCESS_METHODS = ('_getattr', '_getattr_path', '_getattr_inner')
+
+# Name prefixes of the per-field hook methods of Mapper.
+HOOK_PREFIXES = ('filter_', 'after_filter_', 'attach_')
+
+# Class attributes which change the plan, the flags built with it or the
+# compiled mapping function.
+PLAN_ATTRIBUTES = frozenset(
+    ('compiled', 'cache_paths') + ACCESS_METHODS + INLINED_METHODS)
+
+# shared: Lengths of the accessor prefixes read by other fields too, which
+# are cached while mapping if Mapper.cache_paths is True.
+FieldPlan = namedtuple('FieldPlan', [
+    'name', 'key', 'accessor', 'field', 'is_nonkey', 'skip_callable',
+    'filter_name', 'after_filter_name', 'attach_name', 'attach_parent',
+    'shared'])
+
+
+def _hook_name(mapper_class, prefix, name):
+    hook_name = prefix + name
+    if hasattr(mapper_class, hook_name):
+        return hook_name
+    return None
+
+
+def overrides(mapper_class, method_name):
+    """Return True if mapper_class overrides method_name of Mapper."""
+    base_class = globals().get('Mapper')
+    if base_class is None:
+        # mapper_class is Mapper itself.
+        return False
+    return getattr(mapper_class, method_name) is not \
+        getattr(base_class, method_name)
+
+
+def _prefixes(entry):
+    if entry.is_nonkey or not entry.accessor:
+        return ()
+    return [entry.accessor[:length]
+            for length in range(1, len(entry.accessor) + 1)]
+
+
+def _share_prefixes(plan):
+    # Set FieldPlan.shared to the prefixes read by two or more fields.
+    counts = Counter(
+        prefix for entry in plan for prefix in _prefixes(entry))
+    return [
+        entry._replace(shared=tuple(
+            len(prefix) for prefix in _prefixes(entry)
+            if counts[prefix] > 1))
+        for entry in plan]
+
+
+def build_plan(mapper_class):
+    """Build the execution plan of mapper_class.
+
+    The plan is a tuple of FieldPlan in the mapping order. Hook methods
+    are resolved here once, so that ``Mapper.as_dict()`` does not need to
+    look them up for every field of every object.
+    """
+    plan = []
+    opt = mapper_class._meta
+    for key in opt.fields:
+        for name, field in opt.fields[key]:
+            plan.append(FieldPlan(
+                name=name,
+                key=key,
+                accessor=split_key(key),
+                field=field,
+                is_nonkey=field.is_nonkey,
+                skip_callable=getattr(field, 'skip_callable', False),
+                filter_name=_hook_name(mapper_class, 'filter_', name),
+                after_filter_name=_hook_name(
+                    mapper_class, 'after_filter_', name),
+                attach_name=_hook_name(mapper_class, 'attach_', name),
+                attach_parent=getattr(field, 'attach_parent', False),
+                shared=()))
+    if getattr(mapper_class, 'cache_paths', False):
+        plan = _share_prefixes(plan)
+    return tuple(plan)
+
+
+EXECUTOR_CLASSES = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+def _map_chunk(mapper_class, chunk, options):
+    # Run in the workers of map_many_parallel.
+    return mapper_class.map_many(chunk, **options)
+
+
+def _iter_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_parallel(mapper_class, iterable, executor, max_workers,
+                   chunk_size, options):
+    owned = isinstance(executor, str)
+    if owned:
+        executor = EXECUTOR_CLASSES[executor](max_workers=max_workers)
+    # Limit the chunks in flight, so that the iterable is not read at once.
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    pending = deque()
+    try:
+        for chunk in _iter_chunks(iterable, chunk_size):
+            pending.append(
+                executor.submit(_map_chunk, mapper_class, chunk, options))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if owned:
+            executor.shutdown()
+
+
+def merge_options(opt, bases, attrs):
+    """Add the fields of the base classes and the fields in attrs to opt.
+    """
+    # Merge bases
+    for base_class in bases:
+        if hasattr(base_class, '_meta'):
+            base_opt = base_class._meta
+            for key in base_opt.fields.keys():
+                lst = base_opt.fields[key]
+                for _name, field in lst:
+                    opt.add_field(_name, field)
+    for k, v in attrs.items():
+        if isinstance(v, BaseField):
+            opt.add_field(k, v)
+
+
 class BaseMapper(type):
     """Metaclass of Mapper.
     """
     def __new__(cls, name, bases, attrs):
-        # copy bases
-        opt = None
-        base_opts = []
-        for base_class in bases:
-            if hasattr(base_class, '_meta'):
-                base_opt = base_class._meta.copy()
-                base_opts.append(base_opt)
         if '_meta' not in attrs:
-            if opt is None:
-                opt = Options()
+            opt = Options()
         else:
             opt = attrs['_meta'].copy()
-        # Merge bases
-        for base_opt in base_opts:
-            for key in base_opt.fields.keys():
-                lst = base_opt.fields[key]
-                for _name, field in lst:
-                    opt.add_field(_name, field)
-        for k, v in attrs.items():
-            if isinstance(v, BaseField):
-                opt.add_field(k, v)
+        merge_options(opt, bases, attrs)
         attrs['_meta'] = opt
-        return type.__new__(cls, name, bases, attrs)
+        new_class = type.__new__(cls, name, bases, attrs)
+        new_class._rebuild_plan()
+        return new_class
+
+    def __setattr__(cls, name, value):
+        super(BaseMapper, cls).__setattr__(name, value)
+        if name.startswith(HOOK_PREFIXES) or name in PLAN_ATTRIBUTES:
+            cls._rebuild_plan()
+
+    def __delattr__(cls, name):
+        super(BaseMapper, cls).__delattr__(name)
+        if name.startswith(HOOK_PREFIXES) or name in PLAN_ATTRIBUTES:
+            cls._rebuild_plan()
+
+    def _rebuild_plan(cls):
+        """Rebuild the plan of this class and its subclasses."""
+        cls._plan = build_plan(cls)
+        cls._key_positions = key_positions(cls._meta.field_names)
+        cls._custom_getattr = overrides(cls, '_getattr')
+        cls._custom_access = any(
+            overrides(cls, method_name) for method_name in ACCESS_METHODS)
+        cls._projected_plans = {}
+        if cls.compiled:
+            cls._compiled_as_dict = compile_mapper(cls, Mapper)
+        else:
+            cls._compiled_as_dict = None
+        for subclass in cls.__subclasses__():
+            subclass._rebuild_plan()
 
 
 class Mapper(metaclass=BaseMapper):
     """Basic Mapper class.
+
+    The ``dict_class`` option selects the class of the mapping results,
+    OrderedDict by default. Options are handed to nested mappers, so
+    ``Mapper(obj, dict_class=dict)`` makes plain dicts all the way through.
     """
     default_options = {}
+    # Use the generated mapping function when this class qualifies.
+    # See bpmappers.compiler.
+    compiled = False
+    # Resolve the accessor prefixes shared by several fields once in an
+    # as_dict() call. The values of the properties and the attributes on
+    # the way are reused, so they must not depend on the access count.
+    cache_paths = False
 
     def __init__(self, data=None, **options):
         """
@@ -86,6 +270,76 @@ class Mapper(metaclass=BaseMapper):
         self.options = self.default_options.copy()
         self.options.update(options)
 
+    @classmethod
+    def map_many(cls, iterable, stream=False, only=None, exclude=None,
+                 **options):
+        """
+        Map each object of iterable.
+
+        One mapper instance and one options dict are shared by the whole
+        batch, which is cheaper than ``Mapper(obj, **options).as_dict()``
+        for each object.
+
+        :iterable: Mapping source objects.
+        :stream: If True, return a generator instead of the list.
+        :only: Paths of the fields to map, see as_dict().
+        :exclude: Paths of the fields not to map, see as_dict().
+        :\\*\\*options: Optional values.
+        """
+        projection = make_projection(only, exclude)
+        if projection is not None:
+            options[PROJECTION_OPTION] = projection
+        results = map(cls._batch_as_dict(options), iterable)
+        if stream:
+            return results
+        return list(results)
+
+    @classmethod
+    def map_many_parallel(cls, iterable, executor='process',
+                          max_workers=None, chunk_size=1000, stream=False,
+                          **options):
+        """
+        Map each object of iterable with a pool of workers.
+
+        The objects are split into chunks and each chunk is mapped by
+        map_many() in a worker. The results are in the order of iterable.
+
+        :iterable: Mapping source objects.
+        :executor: ``'process'``, ``'thread'`` or a
+         concurrent.futures.Executor instance.
+        :max_workers: The number of workers of the executor.
+        :chunk_size: The number of objects mapped in a task.
+        :stream: If True, return a generator instead of the list.
+        :\\*\\*options: Optional values.
+
+        With the process pool, the mapper class must be importable from its
+        module, and the objects, the options and the results must be
+        picklable.
+
+        :raises ValueError: if chunk_size is less than 1.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be 1 or more: %r' % chunk_size)
+        results = _iter_parallel(
+            cls, iterable, executor, max_workers, chunk_size, options)
+        if stream:
+            return results
+        return list(results)
+
+    @classmethod
+    def _batch_as_dict(cls, options):
+        """Return the function mapping one source object with options.
+        """
+        if cls.__init__ is not Mapper.__init__:
+            # The mapper may depend on the data in the constructor.
+            return lambda data: cls(data, **options).as_dict()
+        mapper = cls(None, **options)
+
+        def as_dict(data):
+            mapper.data = data
+            return mapper.as_dict()
+        return as_dict
+
     def _getattr_inner(self, obj, key):
         # Priority "attr", "dict", "getattr".
         if not key:
@@ -101,77 +355,299 @@ class Mapper(metaclass=BaseMapper):
                     ' "%(key)s in %(mapper)s"' % {
                         'obj': obj, 'key': key, 'mapper': repr(self)})
 
+    def _getattr_path(self, obj, path):
+        # Follow the accessor path made by split_key().
+        getattr_inner = self._getattr_inner
+        value = getattr_inner(obj, path[0])
+        for key in path[1:]:
+            # If child object is callable, call that object.
+            if hasattr(value, '__call__'):
+                value = value()
+            value = getattr_inner(value, key)
+        return value
+
+    def _getattr_path_cached(self, obj, path, shared, cache):
+        # Follow the accessor path starting at the longest prefix resolved
+        # by the previous fields, and store the shared prefixes to cache.
+        # cache maps a prefix to the list of its value and the value called
+        # to read the child objects, MISSING until it is needed.
+        value = obj
+        start = 0
+        last = len(path)
+        for length in reversed(shared):
+            cached = cache.get(path[:length])
+            if cached is None:
+                continue
+            if length == last:
+                return cached[0]
+            if cached[1] is MISSING:
+                cached[1] = cached[0]
+                if hasattr(cached[1], '__call__'):
+                    cached[1] = cached[1]()
+            value = cached[1]
+            start = length
+            break
+        getattr_inner = self._getattr_inner
+        for i in range(start, last):
+            value = getattr_inner(value, path[i])
+            cached = None
+            if i + 1 in shared:
+                cached = cache[path[:i + 1]] = [value, MISSING]
+            if i + 1 < last:
+                # If child object is callable, call that object.
+                if hasattr(value, '__call__'):
+                    value = value()
+                if cached is not None:
+                    cached[1] = value
+        return value
+
     def _getattr(self, obj, key):
-        # Recursive call if it is dot splited accessor.
-        if '.' in key:
-            keys = key.split('.')
-            obj_child = self._getattr(obj, keys[0])
+        # key may be dot splited accessor.
+        return self._getattr_path(obj, split_key(key))
+
+    def _probe_path(self, obj, path):
+        # Follow the accessor path like _getattr_path(), but return MISSING
+        # instead of raising DataError if obj does not have the path.
+        value = obj
+        for i, key in enumerate(path):
             # If child object is callable, call that object.
-            if hasattr(obj_child, '__call__'):
-                obj_child = obj_child()
-            value = self._getattr(obj_child, '.'.join(keys[1:]))
+            if i and hasattr(value, '__call__'):
+                value = value()
+            if not key:
+                value = None
+            elif isinstance(value, dict):
+                value = value.get(key)
+            else:
+                value = getattr(value, key, MISSING)
+                if value is MISSING:
+                    return MISSING
+        return value
+
+    def _getattr_from_list(self, key):
+        # if data is list, use the first item which has the key.
+        if self._custom_access:
+            message = None
+            for item in self.data:
+                try:
+                    return self._getattr(item, key)
+                except DataError as e:
+                    message = e.message
         else:
-            value = self._getattr_inner(obj, key)
+            path = split_key(key)
+            for item in self.data:
+                value = self._probe_path(item, path)
+                if value is not MISSING:
+                    return value
+            message = None
+        if message is None:
+            message = 'No item of the list has this key "%(key)s"' \
+                ' in %(mapper)s' % {'key': key, 'mapper': repr(self)}
+        raise DataError(message)
+
+    def _source_value(self, entry, data_is_list, cache=None):
+        # Read the value of the plan entry from the mapping source.
+        if entry.is_nonkey:
+            return None
+        if data_is_list:
+            return self._getattr_from_list(entry.key)
+        if self._custom_getattr:
+            return self._getattr(self.data, entry.key)
+        if entry.shared:
+            return self._getattr_path_cached(
+                self.data, entry.accessor, entry.shared, cache)
+        return self._getattr_path(self.data, entry.accessor)
+
+    async def _getattr_path_async(self, obj, path):
+        # Follow the accessor path awaiting the awaitable values.
+        value = self._getattr_path(obj, path[:1])
+        for key in path[1:]:
+            if isawaitable(value):
+                value = await value
+            # If child object is callable, call that object.
+            if hasattr(value, '__call__'):
+                value = value()
+                if isawaitable(value):
+                    value = await value
+            value = self._getattr_path(value, (key,))
+        if isawaitable(value):
+            value = await value
         return value
 
-    def as_dict(self):
+    async def _field_value_async(self, entry, data_is_list):
+        if entry.is_nonkey:
+            v = None
+        elif data_is_list:
+            v = self._getattr_from_list(entry.key)
+        elif self._custom_getattr:
+            v = self._getattr(self.data, entry.key)
+        else:
+            v = await self._getattr_path_async(self.data, entry.accessor)
+        if isawaitable(v):
+            v = await v
+        if not entry.skip_callable and hasattr(v, '__call__'):
+            v = v()
+            if isawaitable(v):
+                v = await v
+        if entry.filter_name is not None:
+            if entry.is_nonkey:
+                v = getattr(self, entry.filter_name)()
+            else:
+                v = getattr(self, entry.filter_name)(v)
+            if isawaitable(v):
+                v = await v
+        value = await entry.field.get_value_async(self, v)
+        # after filter hook
+        if entry.after_filter_name is not None:
+            value = getattr(self, entry.after_filter_name)(value)
+            if isawaitable(value):
+                value = await value
+        return value
+
+    async def as_dict_async(self, only=None, exclude=None):
+        """
+        Coroutine version of as_dict().
+
+        Awaitable values returned by the attribute access, the callable
+        values, the filter hooks and the field callbacks are awaited.
+        The fields delegating to other mappers are mapped concurrently.
+        """
+        plan = self._plan
+        if only is not None or exclude:
+            projection = make_projection(only, exclude)
+        else:
+            projection = self.options.get(PROJECTION_OPTION)
+        if projection is not None:
+            plan = self._projected_plan(projection)
+        data_is_list = isinstance(self.data, list)
+        values = []
+        delegates = []
+        for i, entry in enumerate(plan):
+            if hasattr(entry.field, 'mapper_class'):
+                # The coroutines are made after the other fields, so that
+                # they are not left unawaited if a field raises.
+                delegates.append((i, entry))
+                values.append(None)
+            else:
+                values.append(
+                    await self._field_value_async(entry, data_is_list))
+        if delegates:
+            results = await asyncio.gather(*[
+                self._field_value_async(entry, data_is_list)
+                for _i, entry in delegates])
+            for (i, _entry), value in zip(delegates, results):
+                values[i] = value
+        parsed = self.options.get('dict_class', OrderedDict)()
+        for entry, value in zip(plan, values):
+            # attach hook
+            if entry.attach_name is not None:
+                getattr(self, entry.attach_name)(parsed, value)
+            elif entry.attach_parent:
+                parsed.update(value)
+            else:
+                parsed[self.key_name(
+                    entry.name, value, unwrap_field(entry.field))] = value
+        return self.order(parsed)
+
+    @classmethod
+    async def map_many_async(cls, iterable, only=None, exclude=None,
+                             **options):
+        """
+        Coroutine version of map_many(). The objects are mapped
+        concurrently by as_dict_async().
+        """
+        projection = make_projection(only, exclude)
+        if projection is not None:
+            options[PROJECTION_OPTION] = projection
+        return list(await asyncio.gather(
+            *[cls(data, **options).as_dict_async() for data in iterable]))
+
+    @classmethod
+    def _projected_plan(cls, projection):
+        """Return the plan of the fields selected by projection."""
+        plans = cls._projected_plans
+        plan = plans.get(projection)
+        if plan is None:
+            if len(plans) >= PROJECTED_PLANS_SIZE:
+                plans.clear()
+            plan = plans[projection] = project_plan(cls._plan, projection)
+        return plan
+
+    def as_dict(self, only=None, exclude=None):
         """
         Return the OrderedDict it is mapping result.
+
+        The result is a dict_class instance if the ``dict_class`` option
+        is given.
+
+        :only: Dot splited paths of the fields to map, e.g.
+         ``['id', 'author.name']`` or ``'id,author.name'``. The paths under
+         a delegating field are handed to the delegated mapper.
+        :exclude: Dot splited paths of the fields not to map.
+
+        While a collector of bpmappers.profiling is enabled, the mapping
+        is recorded to the collector.
         """
-        parsed = OrderedDict()
-        for k in self._meta.fields:
-            # _meta.fields is MultiValueDict
-            for name, field in self._meta.fields[k]:
-                if field.is_nonkey:
-                    v = None
-                elif isinstance(self.data, list):
-                    # if data is list, use first.
-                    data_check = False
-                    error = None
-                    for item in self.data:
-                        try:
-                            v = self._getattr(item, k)
-                        except DataError:
-                            import sys
-                            error = sys.exc_info()[1]
-                        else:
-                            data_check = True
-                            break
-                    if not data_check:
-                        raise DataError(error.message)
-                else:
-                    v = self._getattr(self.data, k)
-                if hasattr(v, '__call__') and not field.skip_callable:
-                    v = v()
-                filter_name = 'filter_%s' % name
-                if hasattr(self, filter_name):
-                    if field.is_nonkey:
-                        v = getattr(self, filter_name)()
-                    else:
-                        v = getattr(self, filter_name)(v)
-                value = field.get_value(self, v)
-                # after filter hook
-                after_filter_name = 'after_filter_%s' % name
-                if hasattr(self, after_filter_name):
-                    value = getattr(self, after_filter_name)(value)
-                # attach hook
-                attach_name = 'attach_%s' % name
-                if hasattr(self, attach_name):
-                    getattr(self, attach_name)(parsed, value)
+        plan = self._plan
+        if only is not None or exclude:
+            projection = make_projection(only, exclude)
+        else:
+            projection = self.options.get(PROJECTION_OPTION)
+        if projection is not None:
+            plan = self._projected_plan(projection)
+        if profiling.collector is not None:
+            return profiling.profiled_as_dict(self, profiling.collector, plan)
+        data = self.data
+        data_is_list = isinstance(data, list)
+        if self._compiled_as_dict is not None and not data_is_list \
+                and projection is None:
+            return self._compiled_as_dict(data)
+        parsed = self.options.get('dict_class', OrderedDict)()
+        custom_getattr = self._custom_getattr
+        # The values of the shared accessor prefixes
+        cache = {}
+        for (name, key, accessor, field, is_nonkey, skip_callable,
+                filter_name, after_filter_name, attach_name,
+                attach_parent, shared) in plan:
+            if is_nonkey:
+                v = None
+            elif data_is_list:
+                v = self._getattr_from_list(key)
+            elif custom_getattr:
+                v = self._getattr(data, key)
+            elif shared:
+                v = self._getattr_path_cached(data, accessor, shared, cache)
+            else:
+                v = self._getattr_path(data, accessor)
+            if not skip_callable and hasattr(v, '__call__'):
+                v = v()
+            if filter_name is not None:
+                if is_nonkey:
+                    v = getattr(self, filter_name)()
                 else:
-                    attach_parent = getattr(field, 'attach_parent', False)
-                    if attach_parent:
-                        parsed.update(value)
-                    else:
-                        parsed[self.key_name(name, value, field)] = value
+                    v = getattr(self, filter_name)(v)
+            value = field.get_value(self, v)
+            # after filter hook
+            if after_filter_name is not None:
+                value = getattr(self, after_filter_name)(value)
+            # attach hook
+            if attach_name is not None:
+                getattr(self, attach_name)(parsed, value)
+            elif attach_parent:
+                parsed.update(value)
+            else:
+                if projection is not None:
+                    field = unwrap_field(field)
+                parsed[self.key_name(name, value, field)] = value
         ordered = self.order(parsed)
         return ordered
 
     def order(self, parsed):
         """
-        This method **must** return the OrderedDict.
+        This method **must** return the OrderedDict, or the dict_class
+        instance if the ``dict_class`` option is given.
         """
-        return sort_dict_with_keys(parsed, self._meta.field_names)
+        return sort_dict_with_positions(
+            parsed, self._key_positions, parsed.__class__)
 
     def key_name(self, name, value, field):
         """
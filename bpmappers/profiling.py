@@ -0,0 +1,223 @@
+"""Opt-in profiling of Mapper.as_dict().
+
+While a collector is enabled, ``Mapper.as_dict()`` records the wall time,
+the number of calls and the number of exceptions of each mapper class and
+each step of its fields::
+
+    from bpmappers import profiling
+
+    with profiling.profile() as collector:
+        BookMapper(book).as_dict()
+    print(collector.format())
+
+The steps recorded for a field are:
+
+:source: Reading the value from the mapping source.
+:filter: ``filter_FOO`` hook.
+:callback: ``callback`` of the field.
+:value: Conversion of the field, ``as_value()``.
+:delegate: Conversion of the fields delegating to other mappers. The
+ delegated mappers are recorded as their own classes.
+:after_callback: ``after_callback`` of the field.
+:after_filter: ``after_filter_FOO`` hook.
+:attach: ``attach_FOO`` hook.
+:field: All the steps of the field.
+
+The whole ``as_dict()`` is recorded with the field name None and the step
+``as_dict``. When no collector is enabled, ``as_dict()`` runs the plain
+mapping loop, the only cost is checking the enabled collector.
+
+Any object having the ``record()`` method of Collector can be enabled as
+a collector, e.g. to send the timings to a metrics service.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+from bpmappers.fields import BaseField
+from bpmappers.projection import unwrap_field
+
+# The enabled collector, shared by all the threads.
+collector = None
+
+
+class Stats(object):
+    """Statistics of one step."""
+    __slots__ = ('calls', 'errors', 'time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.time = 0.0
+
+    def __repr__(self):
+        return '<Stats: calls=%d errors=%d time=%f>' % (
+            self.calls, self.errors, self.time)
+
+
+class Collector(object):
+    """Collector aggregating the records by mapper class, field and step.
+    """
+    def __init__(self):
+        # {(mapper_class, field_name, step): Stats}
+        self.stats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, mapper_class, field_name, step, elapsed, failed):
+        """Record a step.
+
+        :mapper_class: Class of the mapper.
+        :field_name: Name of the field, None for the whole as_dict().
+        :step: Name of the step.
+        :elapsed: Wall time in seconds.
+        :failed: True if the step raised an exception.
+        """
+        key = (mapper_class, field_name, step)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = Stats()
+            stats.calls += 1
+            stats.time += elapsed
+            if failed:
+                stats.errors += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats.clear()
+
+    def items(self):
+        """Return the list of the keys and Stats, the slowest first."""
+        with self._lock:
+            items = list(self.stats.items())
+        return sorted(items, key=lambda item: item[1].time, reverse=True)
+
+    def format(self, limit=None):
+        """Return the records as a text table, the slowest first."""
+        lines = ['%-40s %-14s %8s %8s %12s' % (
+            'mapper.field', 'step', 'calls', 'errors', 'time')]
+        for (mapper_class, field_name, step), stats in \
+                self.items()[:limit]:
+            name = mapper_class.__qualname__
+            if field_name is not None:
+                name = '%s.%s' % (name, field_name)
+            lines.append('%-40s %-14s %8d %8d %12.6f' % (
+                name, step, stats.calls, stats.errors, stats.time))
+        return '\n'.join(lines)
+
+
+def enable(new_collector=None):
+    """Enable the collector, a new Collector if omitted.
+
+    :return: The enabled collector.
+    """
+    global collector
+    if new_collector is None:
+        new_collector = Collector()
+    collector = new_collector
+    return new_collector
+
+
+def disable():
+    """Disable the collector."""
+    global collector
+    collector = None
+
+
+@contextmanager
+def profile(new_collector=None):
+    """Context manager enabling the collector in the block.
+
+    The previously enabled collector is restored at the exit.
+    """
+    global collector
+    previous = collector
+    enabled = enable(new_collector)
+    try:
+        yield enabled
+    finally:
+        collector = previous
+
+
+def _timed(record, mapper_class, name, step, func, *args):
+    start = perf_counter()
+    try:
+        result = func(*args)
+    except Exception:
+        record(mapper_class, name, step, perf_counter() - start, True)
+        raise
+    record(mapper_class, name, step, perf_counter() - start, False)
+    return result
+
+
+def _field_value(record, mapper, entry, v):
+    mapper_class = mapper.__class__
+    name = entry.name
+    field = entry.field
+    if type(field).get_value is not BaseField.get_value:
+        return _timed(
+            record, mapper_class, name, 'value', field.get_value, mapper, v)
+    if field._callback is not None:
+        v = _timed(
+            record, mapper_class, name, 'callback', field.callback_value, v)
+    step = 'delegate' if hasattr(field, 'mapper_class') else 'value'
+    v = _timed(record, mapper_class, name, step, field.as_value, mapper, v)
+    if field._after_callback is not None:
+        v = _timed(
+            record, mapper_class, name, 'after_callback',
+            field.after_callback_value, v)
+    return v
+
+
+def _map_field(record, mapper, entry, data_is_list, cache, parsed):
+    mapper_class = mapper.__class__
+    name = entry.name
+    v = _timed(
+        record, mapper_class, name, 'source',
+        mapper._source_value, entry, data_is_list, cache)
+    if not entry.skip_callable and hasattr(v, '__call__'):
+        v = v()
+    if entry.filter_name is not None:
+        args = () if entry.is_nonkey else (v,)
+        v = _timed(
+            record, mapper_class, name, 'filter',
+            getattr(mapper, entry.filter_name), *args)
+    value = _field_value(record, mapper, entry, v)
+    if entry.after_filter_name is not None:
+        value = _timed(
+            record, mapper_class, name, 'after_filter',
+            getattr(mapper, entry.after_filter_name), value)
+    if entry.attach_name is not None:
+        _timed(
+            record, mapper_class, name, 'attach',
+            getattr(mapper, entry.attach_name), parsed, value)
+    elif entry.attach_parent:
+        parsed.update(value)
+    else:
+        parsed[mapper.key_name(name, value, unwrap_field(entry.field))] = value
+
+
+def _as_dict(record, mapper, plan):
+    data_is_list = isinstance(mapper.data, list)
+    parsed = mapper.options.get('dict_class', OrderedDict)()
+    cache = {}
+    for entry in plan:
+        _timed(
+            record, mapper.__class__, entry.name, 'field',
+            _map_field, record, mapper, entry, data_is_list, cache, parsed)
+    return mapper.order(parsed)
+
+
+def profiled_as_dict(mapper, collector, plan=None):
+    """Map with mapper recording the steps to collector.
+
+    This is used by ``Mapper.as_dict()`` while a collector is enabled.
+
+    :plan: The plan to map with, the plan of the mapper if omitted.
+    """
+    if plan is None:
+        plan = mapper._plan
+    return _timed(
+        collector.record, mapper.__class__, None, 'as_dict',
+        _as_dict, collector.record, mapper, plan)
@@ -0,0 +1,144 @@
+"""Projection of Mapper plans to a subset of the fields.
+
+``Mapper.as_dict(only=..., exclude=...)`` maps only the requested fields.
+The fields are given as dot splited paths of the field names, such as
+``['id', 'name', 'author.name']``, or as a comma separated string. The
+paths under a field delegating to another mapper are handed to that
+mapper, so the skipped fields never read the source, run the callbacks
+or map the children.
+
+The projection is handed to the delegated mappers with the
+``PROJECTION_OPTION`` mapper option.
+"""
+
+PROJECTION_OPTION = '_projection'
+
+# The number of the projected plans cached per mapper class.
+PROJECTED_PLANS_SIZE = 256
+
+
+def _path_tree(paths):
+    # {'author': {'name': None}, 'id': None}, None means the whole field.
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    tree = {}
+    for path in paths:
+        names = path.strip().split('.')
+        if not names[0]:
+            continue
+        node = tree
+        for name in names[:-1]:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def _freeze(tree):
+    return tuple(sorted(
+        ((name, None if sub is None else _freeze(sub))
+         for name, sub in tree.items()),
+        key=lambda item: item[0]))
+
+
+def make_projection(only=None, exclude=None):
+    """Return the hashable projection of only and exclude.
+
+    :only: Paths of the fields to map, all the fields if None.
+    :exclude: Paths of the fields not to map.
+    :return: The pair of the frozen path trees of only and exclude, or
+     None if the projection maps all the fields.
+    """
+    if only is None and not exclude:
+        return None
+    return (
+        None if only is None else _freeze(_path_tree(only)),
+        _freeze(_path_tree(exclude)) if exclude else None)
+
+
+class ProjectedMapper(object):
+    """View of the mapper for the delegating fields of a projected plan.
+
+    It has the options for the delegated mappers, the other attributes are
+    read from the mapper.
+    """
+    __slots__ = ('_mapper', 'options')
+
+    def __init__(self, mapper, options):
+        self._mapper = mapper
+        self.options = options
+
+    def __getattr__(self, name):
+        return getattr(self._mapper, name)
+
+    def __repr__(self):
+        return repr(self._mapper)
+
+    def __str__(self):
+        return str(self._mapper)
+
+
+class ProjectedField(object):
+    """Wrapper of the delegating field handing projection to the delegated
+    mapper.
+    """
+    __slots__ = ('field', 'projection')
+
+    def __init__(self, field, projection):
+        self.field = field
+        self.projection = projection
+
+    def _mapper(self, mapper):
+        # The view of mapper with the projection of the delegated mapper.
+        options = dict(mapper.options)
+        if self.projection is None:
+            options.pop(PROJECTION_OPTION, None)
+        else:
+            options[PROJECTION_OPTION] = self.projection
+        return ProjectedMapper(mapper, options)
+
+    def get_value(self, mapper, value):
+        return self.field.get_value(self._mapper(mapper), value)
+
+    def get_value_async(self, mapper, value):
+        return self.field.get_value_async(self._mapper(mapper), value)
+
+    def __getattr__(self, name):
+        return getattr(self.field, name)
+
+
+def unwrap_field(field):
+    """Return the field of the mapper class wrapped by ProjectedField."""
+    if type(field) is ProjectedField:
+        return field.field
+    return field
+
+
+def project_plan(plan, projection):
+    """Return the entries of plan selected by projection.
+
+    The fields delegating to other mappers are wrapped by ProjectedField.
+    """
+    only, exclude = projection
+    only = None if only is None else dict(only)
+    exclude = dict(exclude or ())
+    projected = []
+    for entry in plan:
+        sub_only = sub_exclude = None
+        if only is not None:
+            if entry.name not in only:
+                continue
+            sub_only = only[entry.name]
+        if entry.name in exclude:
+            sub_exclude = exclude[entry.name]
+            if sub_exclude is None:
+                continue
+        if hasattr(entry.field, 'mapper_class'):
+            child = None
+            if sub_only is not None or sub_exclude is not None:
+                child = (sub_only, sub_exclude)
+            entry = entry._replace(field=ProjectedField(entry.field, child))
+        projected.append(entry)
+    return tuple(projected)
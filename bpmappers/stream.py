@@ -0,0 +1,52 @@
+"""Streaming JSON serialization of mapping results.
+
+The objects are mapped one by one and each result is encoded and released
+before the next object is mapped, so the memory usage does not grow with
+the number of objects.
+"""
+import json
+from collections.abc import Iterator
+
+
+class JSONEncoder(json.JSONEncoder):
+    """JSONEncoder which encodes iterators as arrays.
+
+    The values of lazy ``ListDelegateField`` are generators, they are
+    consumed while encoding.
+    """
+    def default(self, o):
+        if isinstance(o, Iterator):
+            return list(o)
+        return super(JSONEncoder, self).default(o)
+
+
+def iter_json(mapper_class, iterable, encoder=None, **options):
+    """Generate the JSON array of the mapping results as text chunks.
+
+    :mapper_class: Mapper class to map each object with.
+    :iterable: Mapping source objects.
+    :encoder: json.JSONEncoder instance, JSONEncoder of this module if
+     omitted.
+    :\\*\\*options: Optional values of the mapper.
+    """
+    if encoder is None:
+        encoder = JSONEncoder()
+    options.setdefault('dict_class', dict)
+    encode = encoder.encode
+    separator = encoder.item_separator
+    results = mapper_class.map_many(iterable, stream=True, **options)
+    yield '['
+    for i, result in enumerate(results):
+        if i:
+            yield separator
+        yield encode(result)
+    yield ']'
+
+
+def dump_json(mapper_class, iterable, fp, encoder=None, **options):
+    """Write the JSON array of the mapping results to fp.
+
+    :fp: File-like object which has the write method.
+    """
+    for chunk in iter_json(mapper_class, iterable, encoder, **options):
+        fp.write(chunk)
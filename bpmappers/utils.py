@@ -1,4 +1,27 @@
 from collections import OrderedDict
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def split_key(key):
+    """Split the dot splited accessor key to the tuple of names.
+
+    :return: tuple, or None if key is None
+    """
+    if key is None:
+        return None
+    return tuple(key.split('.'))
+
+
+def key_positions(keys):
+    """Return the dict mapping each key of keys list to its position.
+
+    :return: dict
+    """
+    positions = {}
+    for i, key in enumerate(keys):
+        positions.setdefault(key, i)
+    return positions
 
 
 def sort_dict_with_keys(target_dict, keys):
@@ -6,12 +29,33 @@ def sort_dict_with_keys(target_dict, keys):
 
     :return: OrderedDict
     """
+    positions = key_positions(keys)
+
     def _key_func(k):
-        if k in keys:
-            return keys.index(k)
-        return -1
+        return positions.get(k, -1)
     key_order = sorted(target_dict.keys(), key=_key_func)
     ordered = OrderedDict()
     for key in key_order:
         ordered[key] = target_dict[key]
     return ordered
+
+
+def sort_dict_with_positions(target_dict, positions, dict_class=OrderedDict):
+    """Sorting target_dict with positions dict made by key_positions().
+
+    target_dict itself is returned if it is already sorted, so the common
+    case costs one pass over the keys and no copy.
+
+    :return: dict_class
+    """
+    get = positions.get
+    last = -1
+    for key in target_dict:
+        position = get(key, -1)
+        if position < last:
+            break
+        last = position
+    else:
+        return target_dict
+    key_order = sorted(target_dict.keys(), key=lambda k: get(k, -1))
+    return dict_class((key, target_dict[key]) for key in key_order)
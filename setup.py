@@ -39,6 +39,7 @@ setup(
     license='MIT License',
     extras_require={
         'django': ['Django'],
+        'numpy': ['numpy'],
         'develop': [
             'Django', 'pytest', 'flake8', 'pytest-django',
             'pytest-pythonpath', 'tox',
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FK_ChildModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spam', models.CharField(max_length=30)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FK_ParentModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('knight', models.TextField()),
+                ('bacon', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='django_app.FK_ChildModel')),
+            ],
+        ),
+    ]
@@ -22,3 +22,13 @@ class M2M_ThroughModel(models.Model):
     child = models.ForeignKey('M2M_Through_ChildModel', on_delete=models.CASCADE)
     parent = models.ForeignKey('M2M_Through_ParentModel', on_delete=models.CASCADE)
     knight = models.CharField(max_length=30)
+
+
+class FK_ChildModel(models.Model):
+    spam = models.CharField(max_length=30)
+
+
+class FK_ParentModel(models.Model):
+    bacon = models.ForeignKey(
+        'FK_ChildModel', null=True, blank=True, on_delete=models.CASCADE)
+    knight = models.TextField()
@@ -0,0 +1,94 @@
+import pytest
+
+from .testing import DummyObject
+
+from bpmappers import fields
+from bpmappers.cache import ResultCache
+from bpmappers.mappers import Mapper
+
+
+class TestResultCache:
+    def test_get(self):
+        target = ResultCache()
+        value = DummyObject(spam="egg")
+        calls = []
+
+        def as_dict(v):
+            calls.append(v)
+            return {'spam': v.spam}
+
+        assert target.get(Mapper, value, as_dict) == {'spam': "egg"}
+        assert target.get(Mapper, value, as_dict) == {'spam': "egg"}
+        assert calls == [value]
+        assert (target.hits, target.misses) == (1, 1)
+
+    def test_eviction(self):
+        target = ResultCache(maxsize=2)
+        a, b, c = DummyObject(), DummyObject(), DummyObject()
+        for value in (a, b, a, c):
+            target.get(Mapper, value, id)
+        assert len(target) == 2
+        # b is the least recently used
+        target.get(Mapper, a, id)
+        target.get(Mapper, b, id)
+        assert (target.hits, target.misses) == (2, 4)
+
+    def test_key(self):
+        target = ResultCache(key=lambda obj: obj.pk)
+        target.get(Mapper, DummyObject(pk=1), lambda v: 'first')
+        assert target.get(Mapper, DummyObject(pk=1), lambda v: None) \
+            == 'first'
+
+    def test_clear(self):
+        target = ResultCache()
+        target.get(Mapper, 1, str)
+        target.clear()
+        assert len(target) == 0
+        assert (target.hits, target.misses) == (0, 0)
+
+
+class CustomerMapper(Mapper):
+    name = fields.RawField()
+    count = fields.NonKeyField()
+
+    def filter_count(self):
+        self.data.count += 1
+        return self.data.count
+
+
+class OrderMapper(Mapper):
+    id = fields.RawField()
+    customer = fields.DelegateField(CustomerMapper)
+    recipients = fields.ListDelegateField(CustomerMapper)
+
+
+class TestDelegateCache:
+    @pytest.fixture
+    def data(self):
+        customer = DummyObject(name="spam", count=0)
+        return [
+            DummyObject(id=i, customer=customer, recipients=[customer])
+            for i in range(3)]
+
+    def test_disabled(self, data):
+        results = OrderMapper.map_many(data)
+        assert results[-1]['recipients'][0]['count'] == 6
+
+    def test_mapping(self, data):
+        cache = ResultCache()
+        results = OrderMapper.map_many(data, delegate_cache=cache)
+        assert [result['customer'] for result in results] == [
+            {'name': "spam", 'count': 1}] * 3
+        assert results[0]['recipients'][0] is results[0]['customer']
+        assert (cache.hits, cache.misses) == (5, 1)
+
+    def test_projection(self):
+        person = DummyObject(name="spam", count=0)
+        data = [DummyObject(id=1, customer=person, recipients=[person])]
+        cache = ResultCache()
+        results = OrderMapper.map_many(
+            data, only=['customer.name', 'recipients'], delegate_cache=cache)
+        assert results == [{
+            'customer': {'name': "spam"},
+            'recipients': [{'name': "spam", 'count': 1}]}]
+        assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,153 @@
+import pytest
+
+from .testing import DummyObject
+
+from bpmappers import columnar, fields
+from bpmappers.exceptions import DataError
+from bpmappers.mappers import Mapper
+
+
+class EventMapper(Mapper):
+    name = fields.RawField(callback=str.upper)
+    status = fields.ChoiceField({0: "draft", 1: "published"})
+    owner = fields.RawField('owner.name')
+    count = fields.RawField(after_callback=str)
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def with_numpy(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(columnar, 'numpy', None)
+    return request.param == 'numpy'
+
+
+@pytest.fixture
+def data():
+    owner = DummyObject(name="spam")
+    return [
+        DummyObject(name="egg", status=1, owner=owner, count=lambda: 1),
+        {'name': "ham", 'status': 0, 'owner': {'name': "bacon"},
+         'count': 2},
+        DummyObject(name="knight", status=1, owner=owner, count=3),
+    ]
+
+
+class TestIsColumnar:
+    def test_columnar(self):
+        assert columnar.is_columnar(EventMapper)
+
+    def test_hooks(self):
+        class HookMapper(EventMapper):
+            def filter_name(self, value):
+                return value
+
+        assert not columnar.is_columnar(HookMapper)
+
+    def test_delegate(self):
+        class DelegateMapper(Mapper):
+            child = fields.DelegateField(EventMapper)
+
+        assert not columnar.is_columnar(DelegateMapper)
+
+
+class TestMapRows:
+    def test_map_rows(self, with_numpy, data):
+        result = columnar.map_rows(EventMapper, iter(data))
+        assert result == EventMapper.map_many(data)
+        assert result[0] == {
+            'name': "EGG", 'status': "published", 'owner': "spam",
+            'count': "1"}
+
+    def test_dict_class(self, with_numpy, data):
+        result = columnar.map_rows(EventMapper, data, dict_class=dict)
+        assert type(result[0]) is dict
+        assert list(result[0]) == ['name', 'status', 'owner', 'count']
+
+    def test_invalid_choice(self, with_numpy, data):
+        data[1]['status'] = 2
+        with pytest.raises(KeyError):
+            columnar.map_rows(EventMapper, data)
+
+    def test_missing_attribute(self, with_numpy, data):
+        del data[2].owner
+        with pytest.raises(DataError):
+            columnar.map_rows(EventMapper, data)
+
+    def test_fallback(self, data):
+        class HookMapper(EventMapper):
+            def after_filter_name(self, value):
+                return value.lower()
+
+        result = columnar.map_rows(HookMapper, data)
+        assert result == HookMapper.map_many(data)
+        assert result[0]['name'] == "egg"
+
+    def test_projection(self, data):
+        result = columnar.map_rows(EventMapper, data, only=['name', 'count'])
+        assert result == EventMapper.map_many(data, only=['name', 'count'])
+        assert list(result[0]) == ['name', 'count']
+        result = columnar.map_rows(EventMapper, data, exclude='status')
+        assert list(result[0]) == ['name', 'owner', 'count']
+
+
+class TestMapColumns:
+    def test_map_columns(self, with_numpy, data):
+        result = columnar.map_columns(EventMapper, data)
+        assert result == {
+            'name': ["EGG", "HAM", "KNIGHT"],
+            'status': ["published", "draft", "published"],
+            'owner': ["spam", "bacon", "spam"],
+            'count': ["1", "2", "3"],
+        }
+
+    def test_arrays(self, data):
+        numpy = pytest.importorskip('numpy')
+        result = columnar.map_columns(EventMapper, data, arrays=True)
+        assert isinstance(result['status'], numpy.ndarray)
+        assert result['status'].tolist() == ["published", "draft", "published"]
+
+    def test_fallback(self, data):
+        class HookMapper(EventMapper):
+            def after_filter_name(self, value):
+                return value.lower()
+
+        result = columnar.map_columns(HookMapper, data)
+        assert result['name'] == ["egg", "ham", "knight"]
+
+    def test_projection(self, data):
+        class HookMapper(EventMapper):
+            def after_filter_name(self, value):
+                return value.lower()
+
+        expected = {'name': ["EGG", "HAM", "KNIGHT"]}
+        assert columnar.map_columns(EventMapper, data, only='name') \
+            == expected
+        assert columnar.map_columns(
+            HookMapper, data, exclude=['status', 'owner', 'count']) \
+            == {'name': ["egg", "ham", "knight"]}
+
+    def test_empty(self):
+        result = columnar.map_columns(EventMapper, [])
+        assert result == {'name': [], 'status': [], 'owner': [], 'count': []}
+
+
+class TestLookupChoices:
+    def test_default(self, with_numpy):
+        target = fields.ChoiceField([(0, "draft")], default="unknown")
+        result = columnar.lookup_choices(target, [0, 1, 0])
+        assert result == ["draft", "unknown", "draft"]
+
+    def test_mixed_types(self, with_numpy):
+        target = fields.ChoiceField({1: "one", 'a': "a"})
+        result = columnar.lookup_choices(target, [1, 'a', 1])
+        assert result == ["one", "a", "one"]
+        target = fields.ChoiceField({1: "one"}, default="?")
+        assert columnar.lookup_choices(target, ['1', 1]) == ["?", "one"]
+
+    def test_array(self):
+        numpy = pytest.importorskip('numpy')
+        target = fields.ChoiceField([(0, "draft"), (1, "published")])
+        result = columnar.lookup_choices(target, numpy.array([1, 0, 1]))
+        assert result == ["published", "draft", "published"]
@@ -358,6 +358,14 @@ class TestCreateModelMapper:
         assert 'spam' in mapper_class._meta.fields
         assert 'bacon' in mapper_class._meta.fields
 
+    def test_cache(self, target, model):
+        from bpmappers.djangomodel import clear_model_mapper_cache
+        mapper_class = target(model, model_fields=['spam'])
+        assert target(model, model_fields=['spam']) is mapper_class
+        assert target(model) is not mapper_class
+        clear_model_mapper_cache()
+        assert target(model, model_fields=['spam']) is not mapper_class
+
 
 class TestForeignKeyFieldModelMapper:
     @pytest.fixture
@@ -817,3 +825,322 @@ class TestMixinModelMapper:
             'knight': "ni",
         }
         assert result == expected
+
+
+@pytest.mark.django_db
+class TestModelMapperRelatedLookups:
+    @pytest.fixture
+    def through_model(self):
+        from django_app.models import M2M_ThroughModel
+        return M2M_ThroughModel
+
+    @pytest.fixture
+    def data(self, through_model):
+        from django_app.models import (
+            M2M_Through_ChildModel, M2M_Through_ParentModel)
+        for i in range(1, 3):
+            child = M2M_Through_ChildModel.objects.create(id=i, spam="egg")
+            parent = M2M_Through_ParentModel.objects.create(id=i)
+            through_model.objects.create(
+                id=i, child=child, parent=parent, knight="ni")
+        return through_model.objects.order_by('id')
+
+    @pytest.fixture
+    def target(self, through_model):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            class Meta:
+                model = through_model
+
+        return TestMapper
+
+    def test_related_lookups(self, target):
+        select_related, prefetch_related = target.related_lookups()
+        assert select_related == ['child', 'parent']
+        assert prefetch_related == ['parent__bacon']
+
+    def test_dotted_key(self, through_model):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            spam = fields.RawField('child.spam')
+
+            class Meta:
+                model = through_model
+                fields = ['id']
+
+        assert TestMapper.related_lookups() == (['child'], [])
+
+    def test_map_queryset(self, target, data, django_assert_num_queries):
+        expected = [target(obj).as_dict() for obj in data]
+        with django_assert_num_queries(2):
+            result = target.map_queryset(data)
+        assert result == expected
+
+
+@pytest.mark.django_db
+class TestModelMapperOnlyColumns:
+    @pytest.fixture
+    def through_model(self):
+        from django_app.models import M2M_ThroughModel
+        return M2M_ThroughModel
+
+    @pytest.fixture
+    def data(self, through_model):
+        from django_app.models import (
+            M2M_Through_ChildModel, M2M_Through_ParentModel)
+        child = M2M_Through_ChildModel.objects.create(id=1, spam="egg")
+        parent = M2M_Through_ParentModel.objects.create(id=1)
+        parent.bacon.add(child, through_defaults={'knight': "ni"})
+        return through_model.objects.order_by('id')
+
+    @pytest.fixture
+    def target(self, through_model):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            class Meta:
+                model = through_model
+
+        return TestMapper
+
+    def test_only_columns(self, target):
+        assert target.only_columns() == [
+            'id', 'child', 'child__id', 'child__spam', 'parent',
+            'parent__id', 'knight']
+
+    def test_projection(self, target):
+        assert target.only_columns(only=['knight', 'child.spam']) == [
+            'child', 'child__spam', 'knight']
+        assert target.related_lookups(only=['knight', 'child.spam']) == (
+            ['child'], [])
+        assert target.only_columns(exclude=['child', 'parent']) == [
+            'id', 'knight']
+
+    def test_dotted_key(self, through_model):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            spam = fields.RawField('child.spam')
+            child_id = fields.RawField()
+            parent = fields.RawField()
+
+            class Meta:
+                model = through_model
+                fields = ['id']
+
+        assert TestMapper.only_columns() == [
+            'id', 'child', 'child__spam', 'parent', 'parent__id']
+
+    def test_not_supported(self, target):
+        class FilterMapper(target):
+            def filter_knight(self, value):
+                return value
+
+        class PropertyMapper(target):
+            spam = fields.RawField('pk')
+
+        class CallbackMapper(target):
+            child = fields.DelegateField(
+                target, callback=lambda child: child.parent_set.first())
+
+        class AfterFilterMapper(target):
+            def after_filter_knight(self, value):
+                return self.data.pk
+
+        class AttachMapper(target):
+            def attach_knight(self, parsed, value):
+                parsed['pk'] = self.data.pk
+
+        assert FilterMapper.only_columns() is None
+        assert AfterFilterMapper.only_columns() is None
+        assert AttachMapper.only_columns() is None
+        assert PropertyMapper.only_columns() is None
+        assert CallbackMapper.only_columns() is None
+        assert CallbackMapper.only_columns(only=['child.id']) is None
+
+    def test_map_queryset(self, target, data, django_assert_num_queries):
+        expected = [target(obj).as_dict(only=['knight', 'child.spam'])
+                    for obj in data]
+        queryset = target.prepare_queryset(
+            data, only=['knight', 'child.spam'], defer=True)
+        assert queryset.query.deferred_loading == (
+            {'child', 'child__spam', 'knight'}, False)
+        with django_assert_num_queries(1):
+            result = target.map_queryset(
+                data, only=['knight', 'child.spam'], defer=True)
+        assert result == expected == [
+            {'child': {'spam': "egg"}, 'knight': "ni"}]
+
+
+@pytest.mark.django_db
+class TestModelMapperMapValues:
+    @pytest.fixture
+    def parent_model(self):
+        from django_app.models import FK_ParentModel
+        return FK_ParentModel
+
+    @pytest.fixture
+    def data(self, parent_model):
+        from django_app.models import FK_ChildModel
+        child = FK_ChildModel.objects.create(id=1, spam="egg")
+        parent_model.objects.create(id=1, bacon=child, knight="ni")
+        parent_model.objects.create(id=2, bacon=None, knight="ham")
+        return parent_model.objects.order_by('id')
+
+    @pytest.fixture
+    def target(self, parent_model):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            spam = fields.RawField('knight')
+            bacon_id = fields.RawField()
+
+            class Meta:
+                model = parent_model
+
+        return TestMapper
+
+    def test_values_plan(self, target):
+        lookups, build = target.values_plan()
+        assert sorted(lookups) == [
+            'bacon', 'bacon__id', 'bacon__spam', 'bacon_id', 'id', 'knight']
+        row = {'bacon': 1, 'bacon__id': 1, 'bacon__spam': "egg"}
+        source = build(tuple(
+            row.get(lookup, lookup) for lookup in lookups))
+        assert source['bacon'] == {'id': 1, 'spam': "egg"}
+        assert source['knight'] == 'knight'
+
+    def test_map_values(self, target, data, django_assert_num_queries):
+        expected = [target(obj).as_dict() for obj in data]
+        with django_assert_num_queries(1):
+            result = target.map_values(data)
+        assert result == expected
+        assert result[1]['bacon'] is None
+
+    def test_fallback(self, target, data):
+        class FilterMapper(target):
+            def filter_spam(self, value):
+                return self.data.bacon.spam
+
+        assert FilterMapper.values_plan() is None
+
+        class AfterFilterMapper(target):
+            def after_filter_spam(self, value):
+                return self.data.pk
+
+        class AttachMapper(target):
+            def attach_spam(self, parsed, value):
+                parsed['pk'] = self.data.pk
+
+        assert AfterFilterMapper.values_plan() is None
+        assert AttachMapper.values_plan() is None
+        assert AfterFilterMapper.map_values(data.filter(id=1))[0]['spam'] \
+            == 1
+        result = FilterMapper.map_values(data.filter(id=1))
+        assert result[0]['spam'] == "egg"
+
+    def test_hook_added(self, target, data):
+        class HookMapper(target):
+            pass
+
+        assert HookMapper.map_values(data)[0]['spam'] == "ni"
+        assert HookMapper.only_columns() is not None
+        target.filter_spam = lambda self, value: self.data.bacon.spam
+        try:
+            assert HookMapper.values_plan() is None
+            assert HookMapper.only_columns() is None
+            assert HookMapper.map_values(data.filter(id=1))[0]['spam'] \
+                == "egg"
+        finally:
+            del target.filter_spam
+        assert HookMapper.values_plan() is not None
+
+
+class TestLazyModelMapper:
+    @pytest.fixture
+    def model(self):
+        from django.db import models
+
+        class DummyModel(models.Model):
+            spam = models.CharField(max_length=30)
+            bacon = models.CharField(max_length=30)
+
+            class Meta:
+                app_label = testing_django.lower_class_name(self)
+
+        return DummyModel
+
+    def target(self, model_class):
+        from bpmappers.djangomodel import ModelMapper
+
+        class TestMapper(ModelMapper):
+            knight = fields.RawField('spam')
+
+            class Meta:
+                model = model_class
+                exclude = ['bacon']
+                lazy = True
+
+        return TestMapper
+
+    def test_mapping(self, model):
+        target = self.target(model)
+        assert target._lazy_pending
+        assert list(target._meta.field_names) == ['knight']
+        result = target(model(id=1, spam="egg", bacon="ham")).as_dict()
+        assert not target._lazy_pending
+        expected = {
+            'id': 1,
+            'spam': "egg",
+            'knight': "egg",
+        }
+        assert result == expected
+        assert list(result.keys()) == ['id', 'spam', 'knight']
+
+    def test_inherited(self, model):
+        target = self.target(model)
+
+        class LazyMapper(target):
+            bacon = fields.RawField()
+
+        class EagerMapper(target):
+            class Meta:
+                model = target.Meta.model
+
+        assert LazyMapper._lazy_pending
+        assert not EagerMapper._lazy_pending
+        assert not target._lazy_pending
+        data = model(id=1, spam="egg", bacon="ham")
+        assert LazyMapper.map_many([data]) == [{
+            'id': 1, 'spam': "egg", 'knight': "egg", 'bacon': "ham"}]
+
+    @pytest.mark.django_db
+    def test_delegated(self, django_assert_num_queries):
+        from django_app.models import FK_ChildModel, FK_ParentModel
+        from bpmappers.djangomodel import ModelMapper
+
+        class ChildMapper(ModelMapper):
+            class Meta:
+                model = FK_ChildModel
+                lazy = True
+
+        class ParentMapper(ModelMapper):
+            bacon = fields.DelegateField(ChildMapper)
+
+            class Meta:
+                model = FK_ParentModel
+
+        child = FK_ChildModel.objects.create(id=1, spam="egg")
+        FK_ParentModel.objects.create(id=1, bacon=child, knight="ni")
+        queryset = FK_ParentModel.objects.all()
+        assert ChildMapper._lazy_pending
+        assert ParentMapper.only_columns() == [
+            'id', 'knight', 'bacon', 'bacon__id', 'bacon__spam']
+        expected = [{'id': 1, 'knight': "ni",
+                     'bacon': {'id': 1, 'spam': "egg"}}]
+        assert ParentMapper.map_values(queryset) == expected
+        with django_assert_num_queries(1):
+            assert ParentMapper.map_queryset(queryset, defer=True) \
+                == expected
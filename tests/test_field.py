@@ -1,6 +1,6 @@
 import pytest
 
-from .testing import DummyCallback
+from .testing import DummyCallback, run_async
 
 
 class TestBaseField:
@@ -102,6 +102,81 @@ class TestChoiceField:
         assert not target.is_nonkey
 
 
+class TestChoiceFieldChoices:
+    "ChoiceField accepts pairs and Enum classes."
+    def test_pairs(self):
+        from bpmappers.fields import ChoiceField
+        target = ChoiceField([(1, "Spam"), (2, "Egg")])
+        assert target.get_value(None, 2) == "Egg"
+
+    def test_named_groups(self):
+        from bpmappers.fields import ChoiceField
+        target = ChoiceField([
+            ("Food", [(1, "Spam"), (2, "Egg")]), (3, "Knight")])
+        assert target.get_value(None, 2) == "Egg"
+        assert target.get_value(None, 3) == "Knight"
+
+    def test_sequence(self):
+        from bpmappers.fields import ChoiceField
+        target = ChoiceField(['no', 'ok'])
+        assert target.get_value(None, 1) == "ok"
+        assert ChoiceField(['zero', 'one', 'two']).get_value(None, 2) \
+            == "two"
+        with pytest.raises(IndexError):
+            target.get_value(None, 2)
+        target = ChoiceField(['no', 'ok'], default="Unknown")
+        assert target.lookup_many([0, 2]) == ["no", "Unknown"]
+
+    def test_enum(self):
+        import enum
+        from bpmappers.fields import ChoiceField
+
+        class Status(enum.IntEnum):
+            DRAFT = 0
+            PUBLISHED = 1
+
+        target = ChoiceField(Status)
+        assert target.get_value(None, 1) == "PUBLISHED"
+        assert target.get_value(None, Status.DRAFT) == "DRAFT"
+        assert target.get_value(None, 'DRAFT') is Status.DRAFT
+
+    def test_enum_label(self):
+        import enum
+        from bpmappers.fields import ChoiceField
+
+        class Status(enum.Enum):
+            DRAFT = 'd'
+            PUBLISHED = 'p'
+
+            @property
+            def label(self):
+                return self.name.title()
+
+        target = ChoiceField(Status)
+        assert target.get_value(None, 'p') == "Published"
+
+    def test_default(self):
+        from bpmappers.fields import ChoiceField
+        target = ChoiceField({1: "Spam"}, default="Unknown")
+        assert target.get_value(None, 2) == "Unknown"
+        assert ChoiceField({1: "Spam"}, default=None).get_value(None, 2) \
+            is None
+
+    def test_missing(self):
+        from bpmappers.fields import ChoiceField
+        with pytest.raises(KeyError):
+            ChoiceField({1: "Spam"}).get_value(None, 2)
+
+    def test_lookup_many(self):
+        from bpmappers.fields import ChoiceField
+        target = ChoiceField([(1, "Spam"), (2, "Egg")])
+        assert target.lookup_many([2, 1, 2]) == ["Egg", "Spam", "Egg"]
+        with pytest.raises(KeyError):
+            target.lookup_many([3])
+        target = ChoiceField([(1, "Spam")], default="-")
+        assert target.lookup_many([1, 3]) == ["Spam", "-"]
+
+
 class DummyMapper:
     def __init__(self, value, **options):
         self.value = value
@@ -288,3 +363,96 @@ class TestNonKeyListDelegateFieldAfterFilter:
             DummyMapper(None), [1, 2, 3])
         assert value == ["Spam", "Spam", "Spam"]
         assert after_filter.called
+
+
+class TestListDelegateFieldNotRequired:
+    "ListDelegateField.required=False"
+    @pytest.fixture
+    def target(self):
+        from bpmappers.fields import ListDelegateField
+        return ListDelegateField(DummyMapper, required=False)
+
+    def test_none_item(self, target):
+        value = target.get_value(
+            DummyMapper(None), [{"Spam": "Egg"}, None])
+        assert value == [{"Spam": "Egg"}, None]
+
+    def test_none_value(self, target):
+        value = target.get_value(DummyMapper(None), None)
+        assert value is None
+
+
+class TestListDelegateFieldLazy:
+    "ListDelegateField.lazy=True"
+    @pytest.fixture
+    def target(self):
+        from bpmappers.fields import ListDelegateField
+        return ListDelegateField(DummyMapper, lazy=True)
+
+    def test_get_value(self, target):
+        callback = DummyCallback({"Spam": "Egg"})
+        target._after_filter = callback
+        value = target.get_value(DummyMapper(None), [1, 2])
+        assert not callback.called
+        assert next(value) == {"Spam": "Egg"}
+        assert callback.called
+        assert list(value) == [{"Spam": "Egg"}]
+
+
+class TestNonKeyListDelegateFieldLazy:
+    "NonKeyListDelegateField.lazy=True"
+    @pytest.fixture
+    def target(self):
+        from bpmappers.fields import NonKeyListDelegateField
+        return NonKeyListDelegateField(DummyMapper, lazy=True)
+
+    def test_get_value(self, target):
+        value = target.get_value(DummyMapper(None), [1, 2])
+        assert not isinstance(value, list)
+        assert list(value) == [1, 2]
+
+
+class TestListDelegateFieldAsync:
+    "ListDelegateField.get_value_async"
+    @pytest.fixture
+    def target(self):
+        from bpmappers.fields import ListDelegateField
+
+        async def after_filter(value):
+            return [value]
+
+        return ListDelegateField(DummyMapper, after_filter=after_filter)
+
+    def test_get_value_async(self, target):
+        value = run_async(target.get_value_async(
+            DummyMapper(None), [{"Spam": "Egg"}, {"Bacon": "Egg"}]))
+        assert value == [[{"Spam": "Egg"}], [{"Bacon": "Egg"}]]
+
+
+class TestFieldSlots:
+    "Fields have no instance dict, subclasses may add one."
+    def test_slots(self):
+        import pickle
+        from bpmappers import fields
+        targets = [
+            fields.NonKeyField(), fields.StubField(), fields.RawField(),
+            fields.ChoiceField({}), fields.DelegateField(DummyMapper),
+            fields.ListDelegateField(DummyMapper),
+            fields.NonKeyDelegateField(DummyMapper),
+            fields.NonKeyListDelegateField(DummyMapper),
+        ]
+        for target in targets:
+            assert not hasattr(target, '__dict__')
+            assert type(pickle.loads(pickle.dumps(target))) is type(target)
+
+    def test_subclass(self):
+        from bpmappers.fields import RawField
+
+        class CustomField(RawField):
+            def __init__(self, *args, **kwargs):
+                self.extra = kwargs.pop('extra')
+                super(CustomField, self).__init__(*args, **kwargs)
+
+        target = CustomField('spam', extra=1)
+        assert target.extra == 1
+        assert target.key == 'spam'
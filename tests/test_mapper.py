@@ -1,8 +1,9 @@
 import pytest
 
-from .testing import DummyObject, DummyCallback
+from .testing import DummyObject, DummyCallback, run_async
 
 from bpmappers import fields
+from bpmappers.mappers import Mapper
 from bpmappers.utils import sort_dict_with_keys
 
 
@@ -406,6 +407,51 @@ class TestMapperListValue:
         assert result == expected
 
 
+class TestMapperMultipleSources:
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            bar = fields.RawField('bacon.knight')
+
+        return TestMapper
+
+    def test_mapping(self, target):
+        data = [
+            DummyObject(spam="egg", bacon=None),
+            DummyObject(bacon=DummyObject(knight=lambda: "ni")),
+        ]
+        assert target(data).as_dict() == {'foo': "egg", 'bar': "ni"}
+
+    def test_dict(self, target):
+        data = [DummyObject(spam="egg"), {'bacon': {}}]
+        assert target(data).as_dict() == {'foo': "egg", 'bar': None}
+
+    def test_missing(self, target):
+        from bpmappers.exceptions import DataError
+        with pytest.raises(DataError) as excinfo:
+            target([DummyObject(spam="egg")]).as_dict()
+        assert 'bacon.knight' in excinfo.value.message
+        with pytest.raises(DataError):
+            target([]).as_dict()
+
+    def test_custom_access(self, target):
+        from bpmappers.exceptions import DataError
+
+        class CustomMapper(target):
+            def _getattr_inner(self, obj, key):
+                return super(CustomMapper, self)._getattr_inner(
+                    obj, key.replace('spam', 'ham'))
+
+        data = [DummyObject(), DummyObject(ham="egg", bacon={})]
+        assert CustomMapper(data).as_dict() == {'foo': "egg", 'bar': None}
+        with pytest.raises(DataError) as excinfo:
+            CustomMapper([DummyObject()]).as_dict()
+        assert 'ham' in excinfo.value.message
+
+
 class TestMapperOrderMethod:
     @pytest.fixture
     def data(self):
@@ -479,3 +525,574 @@ class TestMapperKeyNameMethod:
             'bar': "egg",
         }
         assert result == expected
+
+
+class TestMapperPlan:
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            bar = fields.NonKeyField()
+
+            def filter_bar(self):
+                return "ni"
+
+        return TestMapper
+
+    def test_plan(self, target):
+        foo, bar = target._plan
+        assert (foo.name, foo.key) == ('foo', 'spam')
+        assert foo.filter_name is None
+        assert foo.attach_name is None
+        assert bar.filter_name == 'filter_bar'
+        assert bar.is_nonkey
+
+    def test_hook_added_after_class_creation(self, target):
+        class InheritedMapper(target):
+            pass
+
+        target.after_filter_foo = lambda self, value: value.upper()
+        result = InheritedMapper(DummyObject(spam="egg")).as_dict()
+        assert result == {'foo': "EGG", 'bar': "ni"}
+        del target.after_filter_foo
+        result = InheritedMapper(DummyObject(spam="egg")).as_dict()
+        assert result == {'foo': "egg", 'bar': "ni"}
+
+    def test_access_method_patched(self, target):
+        from unittest import mock
+
+        data = DummyObject(spam="egg")
+        with mock.patch.object(
+                target, '_getattr', lambda self, obj, key: "ham"):
+            assert target(data).as_dict()['foo'] == "ham"
+            assert target([data]).as_dict()['foo'] == "ham"
+        assert target(data).as_dict()['foo'] == "egg"
+
+
+class TestCompiledMapper:
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class ChildMapper(Mapper):
+            name = fields.RawField()
+
+        class TestMapper(Mapper):
+            compiled = True
+            foo = fields.RawField('spam')
+            bar = fields.RawField('egg.bacon')
+            baz = fields.ChoiceField({1: "one"}, 'knights')
+            child = fields.DelegateField(ChildMapper)
+            stub = fields.StubField("ni")
+
+        return TestMapper
+
+    @pytest.fixture
+    def expected(self):
+        return {
+            'foo': "egg",
+            'bar': "ham",
+            'baz': "one",
+            'child': {'name': "spam"},
+            'stub': "ni",
+        }
+
+    def test_compiled(self, target):
+        assert target._compiled_as_dict is not None
+
+    def test_mapping_object(self, target, expected):
+        data = DummyObject(
+            spam=DummyCallback("egg"), egg=DummyObject(bacon="ham"),
+            knights=1, child=DummyObject(name="spam"))
+        result = target(data).as_dict()
+        assert result == expected
+        assert list(result.keys()) == ['foo', 'bar', 'baz', 'child', 'stub']
+
+    def test_mapping_dict(self, target, expected):
+        data = {
+            'spam': "egg", 'egg': {'bacon': "ham"}, 'knights': 1,
+            'child': {'name': "spam"}}
+        assert target(data).as_dict() == expected
+
+    def test_data_error(self, target):
+        from bpmappers.exceptions import DataError
+        with pytest.raises(DataError):
+            target(DummyObject()).as_dict()
+
+    def test_hook_fallback(self, target):
+        class HookMapper(target):
+            def filter_foo(self, value):
+                return value.upper()
+
+        assert HookMapper._compiled_as_dict is None
+        data = {'spam': "egg", 'egg': {}, 'knights': 1, 'child': {}}
+        assert HookMapper(data).as_dict()['foo'] == "EGG"
+
+    def test_method_assigned(self, target):
+        data = {'spam': "egg", 'egg': {}, 'knights': 1, 'child': {}}
+        target.key_name = lambda self, name, value, field: name.upper()
+        assert target._compiled_as_dict is None
+        assert 'FOO' in target(data).as_dict()
+        del target.key_name
+        assert target._compiled_as_dict is not None
+        assert 'foo' in target(data).as_dict()
+
+
+class TestMapperMapMany:
+    @pytest.fixture
+    def data(self):
+        return [DummyObject(spam="egg"), DummyObject(spam="ham")]
+
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            bar = fields.NonKeyField()
+
+            def filter_bar(self):
+                return self.options.get('bacon')
+
+        return TestMapper
+
+    def test_mapping(self, target, data):
+        result = target.map_many(data, bacon="ni")
+        expected = [
+            {'foo': "egg", 'bar': "ni"},
+            {'foo': "ham", 'bar': "ni"},
+        ]
+        assert result == expected
+
+    def test_stream(self, target, data):
+        result = target.map_many(iter(data), stream=True)
+        assert not isinstance(result, list)
+        assert next(result) == {'foo': "egg", 'bar': None}
+        assert next(result) == {'foo': "ham", 'bar': None}
+
+    def test_custom_init(self, target, data):
+        class InitMapper(target):
+            def __init__(self, data, **options):
+                super(InitMapper, self).__init__(data, **options)
+                self.options['bacon'] = data.spam.upper()
+
+        result = InitMapper.map_many(data)
+        assert [row['bar'] for row in result] == ["EGG", "HAM"]
+
+    def test_list_delegate(self, target, data):
+        from bpmappers.mappers import Mapper
+
+        class ParentMapper(Mapper):
+            items = fields.ListDelegateField(target)
+
+        result = ParentMapper({'items': data}, bacon="ni").as_dict()
+        expected = {'items': [
+            {'foo': "egg", 'bar': "ni"},
+            {'foo': "ham", 'bar': "ni"},
+        ]}
+        assert result == expected
+
+
+class TestInheritedMapperOverrideOrder:
+    @pytest.fixture
+    def data(self):
+        return DummyObject(spam="egg", bacon="ham")
+
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            bar = fields.RawField('bacon')
+
+        class InheritedMapper(TestMapper):
+            foo = fields.RawField('spam', callback=str.upper)
+
+        return InheritedMapper
+
+    def test_mapping(self, target, data):
+        result = target(data).as_dict()
+        assert list(result.items()) == [('foo', "EGG"), ('bar', "ham")]
+
+
+class TestOptionsAddField:
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Options
+        return Options()
+
+    def test_add_field(self, target):
+        target.add_field('foo', fields.RawField('spam'))
+        target.add_field('bar', fields.RawField('spam'))
+        target.add_field('baz', fields.NonKeyField())
+        assert target.field_names == ['foo', 'bar', 'baz']
+        assert [(key, [name for name, _field in pairs])
+                for key, pairs in target.fields.items()] == [
+            ('spam', ['foo', 'bar']), (None, ['baz'])]
+
+    def test_override(self, target):
+        target.add_field('foo', fields.RawField('spam'))
+        target.add_field('bar', fields.RawField('egg'))
+        field = fields.RawField('ham')
+        target.add_field('foo', field)
+        assert target.field_names == ['foo', 'bar']
+        assert list(target.fields) == ['egg', 'ham']
+        assert target.fields['ham'] == (('foo', field),)
+
+    def test_copy(self, target):
+        target.add_field('foo', fields.RawField('spam'))
+        copied = target.copy()
+        copied.add_field('foo', fields.RawField('egg'))
+        assert list(target.fields) == ['spam']
+        assert list(copied.fields) == ['egg']
+        assert copied.field_names == ['foo']
+
+
+class TestDictClassOption:
+    @pytest.fixture
+    def data(self):
+        return DummyObject(
+            spam="egg", items=[DummyObject(spam="ham")],
+            child=DummyObject(spam="bacon"))
+
+    def target(self, compiled):
+        from bpmappers.mappers import Mapper
+
+        class ChildMapper(Mapper):
+            foo = fields.RawField('spam')
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            items = fields.ListDelegateField(ChildMapper)
+            child = fields.DelegateField(ChildMapper)
+
+        TestMapper.compiled = compiled
+        ChildMapper.compiled = compiled
+        return TestMapper
+
+    @pytest.mark.parametrize('compiled', [False, True])
+    def test_mapping(self, data, compiled):
+        result = self.target(compiled)(data, dict_class=dict).as_dict()
+        expected = {
+            'foo': "egg",
+            'items': [{'foo': "ham"}],
+            'child': {'foo': "bacon"},
+        }
+        assert result == expected
+        assert type(result) is dict
+        assert type(result['items'][0]) is dict
+        assert type(result['child']) is dict
+
+    @pytest.mark.parametrize('compiled', [False, True])
+    def test_default(self, data, compiled):
+        from collections import OrderedDict
+        result = self.target(compiled)(data).as_dict()
+        assert type(result) is OrderedDict
+        assert type(result['child']) is OrderedDict
+
+
+class TestMapperCustomGetattr:
+    @pytest.fixture
+    def data(self):
+        return {"spam": {"egg": "ham"}}
+
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam.egg')
+
+            def _getattr(self, obj, key):
+                return key
+
+        return TestMapper
+
+    def test_mapping(self, target, data):
+        result = target(data).as_dict()
+        assert result == {'foo': "spam.egg"}
+
+
+class ParallelMapper(Mapper):
+    "The process pool pickles the mapper class by its name."
+    foo = fields.RawField('spam')
+    bar = fields.NonKeyField()
+
+    def filter_bar(self):
+        return self.options.get('bacon')
+
+
+class TestMapperMapManyParallel:
+    @pytest.fixture
+    def data(self):
+        return [{'spam': i} for i in range(25)]
+
+    @pytest.fixture
+    def expected(self, data):
+        return ParallelMapper.map_many(data, bacon="ni")
+
+    @pytest.mark.parametrize('executor', ['thread', 'process'])
+    def test_mapping(self, data, expected, executor):
+        result = ParallelMapper.map_many_parallel(
+            data, executor=executor, max_workers=2, chunk_size=4,
+            bacon="ni")
+        assert result == expected
+
+    def test_executor_instance(self, data, expected):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            result = ParallelMapper.map_many_parallel(
+                iter(data), executor=executor, chunk_size=3, stream=True,
+                bacon="ni")
+            assert not isinstance(result, list)
+            assert list(result) == expected
+
+    @pytest.mark.parametrize('chunk_size', [0, -1])
+    def test_invalid_chunk_size(self, data, chunk_size):
+        with pytest.raises(ValueError):
+            ParallelMapper.map_many_parallel(
+                data, executor='thread', chunk_size=chunk_size, stream=True)
+
+
+class TestMapperAsDictAsync:
+    @pytest.fixture
+    def data(self):
+        import asyncio
+
+        async def fetch(value):
+            await asyncio.sleep(0)
+            return value
+
+        return DummyObject(
+            spam=lambda: fetch("egg"),
+            bacon=fetch(DummyObject(name=lambda: fetch("ham"))),
+            items=[DummyObject(name="ni"), DummyObject(name="knight")],
+            fetch=fetch)
+
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class ChildMapper(Mapper):
+            name = fields.RawField()
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            bar = fields.RawField('bacon.name')
+            items = fields.ListDelegateField(ChildMapper)
+            first = fields.DelegateField(
+                ChildMapper, 'items',
+                before_filter=lambda items: items[0])
+            baz = fields.NonKeyField()
+
+            async def filter_baz(self):
+                return await self.data.fetch("spam")
+
+            def after_filter_foo(self, value):
+                return self.data.fetch(value.upper())
+
+        return TestMapper
+
+    def test_mapping(self, target, data):
+        result = run_async(target(data).as_dict_async())
+        expected = {
+            'foo': "EGG",
+            'bar': "ham",
+            'items': [{'name': "ni"}, {'name': "knight"}],
+            'first': {'name': "ni"},
+            'baz': "spam",
+        }
+        assert result == expected
+        assert list(result.keys()) == ['foo', 'bar', 'items', 'first', 'baz']
+
+    def test_projection(self, target, data):
+        result = run_async(target(data).as_dict_async(
+            only=['foo', 'first.name', 'items'], exclude='items.name'))
+        assert result == {'foo': "EGG", 'items': [{}, {}],
+                          'first': {'name': "ni"}}
+        result = run_async(target.map_many_async([data], only='bar'))
+        assert result == [{'bar': "ham"}]
+
+    def test_error(self, target, data):
+        import gc
+        import warnings
+
+        class ErrorMapper(target):
+            def filter_baz(self):
+                raise ValueError
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with pytest.raises(ValueError):
+                run_async(ErrorMapper(data).as_dict_async())
+            gc.collect()
+        assert not [w for w in caught if w.category is RuntimeWarning]
+
+    def test_map_many_async(self):
+        from bpmappers.mappers import Mapper
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+
+        result = run_async(TestMapper.map_many_async(
+            [{'spam': "egg"}, {'spam': "ham"}], dict_class=dict))
+        assert result == [{'foo': "egg"}, {'foo': "ham"}]
+
+
+class Profile(object):
+    def __init__(self, counter):
+        self.counter = counter
+
+    @property
+    def address(self):
+        self.counter.append('address')
+        return {'city': "Tokyo", 'zip': "100-0001"}
+
+
+class User(object):
+    def __init__(self):
+        self.counter = []
+
+    @property
+    def profile(self):
+        self.counter.append('profile')
+        return Profile(self.counter)
+
+
+class TestMapperCachePaths:
+    def target(self, cache_paths):
+        class TestMapper(Mapper):
+            city = fields.RawField('profile.address.city')
+            zip = fields.RawField('profile.address.zip')
+            profile = fields.RawField('profile', callback=type)
+
+        TestMapper.cache_paths = cache_paths
+        return TestMapper
+
+    @pytest.mark.parametrize('cache_paths, counter', [
+        (False, ['profile', 'address', 'profile', 'address', 'profile']),
+        (True, ['profile', 'address']),
+    ])
+    def test_mapping(self, cache_paths, counter):
+        data = User()
+        result = self.target(cache_paths)(data).as_dict()
+        assert result == {'city': "Tokyo", 'zip': "100-0001",
+                          'profile': Profile}
+        assert data.counter == counter
+
+    def test_plan(self):
+        city, zip, profile = self.target(True)._plan
+        assert city.shared == (1, 2)
+        assert zip.shared == (1, 2)
+        assert profile.shared == (1,)
+        assert self.target(False)._plan[0].shared == ()
+
+    def test_per_call(self):
+        data = User()
+        mapper = self.target(True)
+        mapper.map_many([data, data])
+        assert data.counter == ['profile', 'address'] * 2
+
+    def test_callable(self):
+        class TestMapper(Mapper):
+            cache_paths = True
+            name = fields.RawField('get_profile.name')
+            age = fields.RawField('get_profile.age')
+
+        calls = []
+
+        def get_profile():
+            calls.append('get_profile')
+            return {'name': "spam", 'age': 20}
+
+        result = TestMapper({'get_profile': get_profile}).as_dict()
+        assert result == {'name': "spam", 'age': 20}
+        assert calls == ['get_profile']
+
+
+class TestMapperProjection:
+    @pytest.fixture
+    def target(self):
+        class AuthorMapper(Mapper):
+            name = fields.RawField()
+            age = fields.RawField()
+
+        class CommentMapper(Mapper):
+            text = fields.RawField()
+            author = fields.DelegateField(AuthorMapper)
+
+        class BookMapper(Mapper):
+            id = fields.RawField()
+            title = fields.RawField(callback=str.upper)
+            author = fields.DelegateField(AuthorMapper)
+            comments = fields.ListDelegateField(CommentMapper, lazy=True)
+
+        return BookMapper
+
+    @pytest.fixture
+    def data(self):
+        author = DummyObject(name="spam", age=20)
+        return DummyObject(
+            id=1, title="egg", author=author,
+            comments=[DummyObject(text="ham", author=author)])
+
+    def test_only(self, target, data):
+        result = target(data).as_dict(only=['id', 'author.name'])
+        assert result == {'id': 1, 'author': {'name': "spam"}}
+
+    def test_only_string(self, target, data):
+        result = target(data).as_dict(only='title, comments.author.age')
+        assert result['title'] == "EGG"
+        assert list(result['comments']) == [{'author': {'age': 20}}]
+
+    def test_exclude(self, target, data):
+        result = target(data).as_dict(
+            exclude=['title', 'comments', 'author.age'])
+        assert result == {'id': 1, 'author': {'name': "spam"}}
+
+    def test_only_exclude(self, target, data):
+        result = target(data).as_dict(
+            only=['id', 'comments'], exclude=['comments.author'])
+        assert result['id'] == 1
+        assert list(result['comments']) == [{'text': "ham"}]
+
+    def test_nested_full(self, target, data):
+        result = target(data).as_dict(only=['comments.author'])
+        assert list(result['comments']) == [
+            {'author': {'name': "spam", 'age': 20}}]
+
+    def test_skipped_accessor(self, target):
+        data = DummyObject(id=1)
+        assert target(data).as_dict(only=['id']) == {'id': 1}
+        assert target(data).as_dict(exclude='title,author,comments') \
+            == {'id': 1}
+
+    def test_key_name(self, target, data):
+        from bpmappers import profiling
+
+        class KeyNameMapper(target):
+            def key_name(self, name, value, field):
+                if isinstance(field, fields.DelegateField):
+                    return name + '_obj'
+                return name
+
+        expected = {'id': 1, 'author_obj': {'name': "spam"}}
+        assert KeyNameMapper(data).as_dict(only='id,author.name') == expected
+        with profiling.profile():
+            assert KeyNameMapper(data).as_dict(only='id,author.name') \
+                == expected
+
+    def test_plan_cache(self, target, data):
+        target(data).as_dict(only=['id', 'title'])
+        target(data).as_dict(only='title,id')
+        assert len(target._projected_plans) == 1
+        target.filter_id = lambda self, value: value
+        assert target._projected_plans == {}
+
+    def test_map_many(self, target, data):
+        result = target.map_many([data, data], only=['author.age'])
+        assert result == [{'author': {'age': 20}}] * 2
+        assert target.map_many([data])[0]['title'] == "EGG"
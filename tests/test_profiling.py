@@ -0,0 +1,118 @@
+import pytest
+
+from .testing import DummyObject
+
+from bpmappers import fields, profiling
+from bpmappers.mappers import Mapper
+
+
+class ChildMapper(Mapper):
+    foo = fields.RawField('spam')
+
+
+class ParentMapper(Mapper):
+    foo = fields.RawField('spam', callback=str.upper)
+    child = fields.DelegateField(ChildMapper)
+    label = fields.NonKeyField()
+
+    def filter_foo(self, value):
+        return value.strip()
+
+    def after_filter_foo(self, value):
+        return value * 2
+
+    def filter_label(self):
+        return 'label'
+
+    def attach_label(self, parsed, value):
+        parsed['extra'] = value
+
+
+class TestProfile:
+    @pytest.fixture
+    def data(self):
+        return DummyObject(spam=" egg ", child=DummyObject(spam="ham"))
+
+    def test_disabled(self, data):
+        assert profiling.collector is None
+        result = ParentMapper(data).as_dict()
+        assert result == {'foo': "EGGEGG", 'child': {'foo': "ham"},
+                          'extra': 'label'}
+
+    def test_profile(self, data):
+        with profiling.profile() as collector:
+            result = ParentMapper(data).as_dict()
+        assert profiling.collector is None
+        assert result == {'foo': "EGGEGG", 'child': {'foo': "ham"},
+                          'extra': 'label'}
+        steps = {
+            (cls, name, step): stats.calls
+            for (cls, name, step), stats in collector.stats.items()}
+        assert steps == {
+            (ParentMapper, None, 'as_dict'): 1,
+            (ParentMapper, 'foo', 'field'): 1,
+            (ParentMapper, 'foo', 'source'): 1,
+            (ParentMapper, 'foo', 'filter'): 1,
+            (ParentMapper, 'foo', 'callback'): 1,
+            (ParentMapper, 'foo', 'value'): 1,
+            (ParentMapper, 'foo', 'after_filter'): 1,
+            (ParentMapper, 'child', 'field'): 1,
+            (ParentMapper, 'child', 'source'): 1,
+            (ParentMapper, 'child', 'delegate'): 1,
+            (ParentMapper, 'label', 'field'): 1,
+            (ParentMapper, 'label', 'source'): 1,
+            (ParentMapper, 'label', 'filter'): 1,
+            (ParentMapper, 'label', 'value'): 1,
+            (ParentMapper, 'label', 'attach'): 1,
+            (ChildMapper, None, 'as_dict'): 1,
+            (ChildMapper, 'foo', 'field'): 1,
+            (ChildMapper, 'foo', 'source'): 1,
+            (ChildMapper, 'foo', 'value'): 1,
+        }
+        assert 'ParentMapper.foo' in collector.format()
+
+    def test_errors(self):
+        data = DummyObject(spam=None, child=None)
+        with profiling.profile() as collector:
+            with pytest.raises(AttributeError):
+                ParentMapper(data).as_dict()
+        assert collector.stats[(ParentMapper, 'foo', 'filter')].errors == 1
+        assert collector.stats[(ParentMapper, 'foo', 'field')].errors == 1
+        assert collector.stats[(ParentMapper, None, 'as_dict')].errors == 1
+
+    def test_custom_collector(self, data):
+        records = []
+
+        class ListCollector:
+            def record(self, mapper_class, field_name, step, elapsed,
+                       failed):
+                records.append((mapper_class, field_name, step, failed))
+
+        with profiling.profile(ListCollector()):
+            ChildMapper(data.child).as_dict()
+        assert records == [
+            (ChildMapper, 'foo', 'source', False),
+            (ChildMapper, 'foo', 'value', False),
+            (ChildMapper, 'foo', 'field', False),
+            (ChildMapper, None, 'as_dict', False),
+        ]
+
+    def test_compiled(self, data):
+        class CompiledMapper(Mapper):
+            compiled = True
+            foo = fields.RawField('spam')
+
+        with profiling.profile() as collector:
+            result = CompiledMapper(data).as_dict()
+        assert result == {'foo': " egg "}
+        assert collector.stats[(CompiledMapper, None, 'as_dict')].calls == 1
+
+    def test_enable_disable(self):
+        collector = profiling.enable()
+        try:
+            ChildMapper({'spam': 1}).as_dict()
+            ChildMapper({'spam': 2}).as_dict()
+        finally:
+            profiling.disable()
+        ChildMapper({'spam': 3}).as_dict()
+        assert collector.stats[(ChildMapper, None, 'as_dict')].calls == 2
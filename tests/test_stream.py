@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from .testing import DummyObject
+
+from bpmappers import fields
+
+
+class TestIterJson:
+    @pytest.fixture
+    def data(self):
+        return [
+            DummyObject(spam="egg", items=[DummyObject(spam="ham")]),
+            DummyObject(spam="bacon", items=[]),
+        ]
+
+    @pytest.fixture
+    def target(self):
+        from bpmappers.mappers import Mapper
+
+        class ChildMapper(Mapper):
+            foo = fields.RawField('spam')
+
+        class TestMapper(Mapper):
+            foo = fields.RawField('spam')
+            items = fields.ListDelegateField(ChildMapper)
+
+        return TestMapper
+
+    def test_iter_json(self, target, data):
+        from bpmappers.stream import iter_json
+        result = ''.join(iter_json(target, iter(data)))
+        expected = [
+            {'foo': "egg", 'items': [{'foo': "ham"}]},
+            {'foo': "bacon", 'items': []},
+        ]
+        assert json.loads(result) == expected
+        assert result == json.dumps(expected)
+
+    def test_empty(self, target):
+        from bpmappers.stream import iter_json
+        assert ''.join(iter_json(target, [])) == '[]'
+
+    def test_encoder(self, target, data):
+        from bpmappers.stream import iter_json
+        encoder = json.JSONEncoder(separators=(',', ':'))
+        result = ''.join(iter_json(target, data, encoder=encoder))
+        assert result == json.dumps(
+            [target(obj).as_dict() for obj in data], separators=(',', ':'))
+
+    def test_dump_json(self, target, data):
+        from bpmappers.stream import dump_json
+        fp = io.StringIO()
+        dump_json(target, data, fp)
+        assert json.loads(fp.getvalue())[1] == {'foo': "bacon", 'items': []}
+
+    def test_lazy(self, data):
+        from bpmappers.mappers import Mapper
+        from bpmappers.stream import iter_json
+
+        class ChildMapper(Mapper):
+            foo = fields.RawField('spam')
+
+        class LazyMapper(Mapper):
+            items = fields.ListDelegateField(ChildMapper, lazy=True)
+
+        result = ''.join(iter_json(LazyMapper, data))
+        assert json.loads(result) == [
+            {'items': [{'foo': "ham"}]}, {'items': []}]
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+
+class TestSortDictWithKeys:
+    def test_sort(self):
+        from bpmappers.utils import sort_dict_with_keys
+        target = OrderedDict([('egg', 2), ('ni', 0), ('spam', 1)])
+        result = sort_dict_with_keys(target, ['spam', 'egg'])
+        assert list(result.items()) == [('ni', 0), ('spam', 1), ('egg', 2)]
+
+
+class TestSortDictWithPositions:
+    def test_key_positions(self):
+        from bpmappers.utils import key_positions
+        positions = key_positions(['spam', 'egg', 'spam'])
+        assert positions == {'spam': 0, 'egg': 1}
+
+    def test_sort(self):
+        from bpmappers.utils import key_positions, sort_dict_with_positions
+        target = OrderedDict([('egg', 2), ('ni', 0), ('spam', 1)])
+        result = sort_dict_with_positions(
+            target, key_positions(['spam', 'egg']))
+        assert list(result.items()) == [('ni', 0), ('spam', 1), ('egg', 2)]
+
+    def test_sorted(self):
+        from bpmappers.utils import key_positions, sort_dict_with_positions
+        target = OrderedDict([('ni', 0), ('spam', 1), ('egg', 2)])
+        result = sort_dict_with_positions(
+            target, key_positions(['spam', 'egg']))
+        assert result is target
+
+
+class TestSplitKey:
+    def test_split(self):
+        from bpmappers.utils import split_key
+        assert split_key('spam.egg.bacon') == ('spam', 'egg', 'bacon')
+        assert split_key('spam') == ('spam',)
+        assert split_key(None) is None
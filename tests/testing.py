@@ -18,3 +18,13 @@ class DummyCallback(object):
 class DummyObject(object):
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
+
+
+def run_async(coroutine):
+    "Run the coroutine in a new event loop."
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()